@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+#####################
+# alignment.py
+#   Matches the x values (numbers or dates) of two series, exactly or within a tolerance, with sorted
+#   arrays and binary searches, so that the series can be subtracted at the matched points
+#####################
+
+import numpy as np
+
+#converts x to numbers that can be compared (dates become microseconds) and tol to the same units (seconds
+#for dates)
+def comparable(x,tol=0):
+  x=np.asarray(x)
+  if np.issubdtype(x.dtype,np.datetime64):
+    return x.astype('datetime64[us]').view(np.int64),tol*1e6
+  return x,tol
+
+#returns the positions in a and in b of the matching values, sorted by the values in a; with tol 0, values
+#match if they are equal, otherwise each value in a matches the nearest value in b within tol (each value is
+#matched at most once, the closest pairs first); repeated values only match once
+def match(a,b,tol=0):
+  a,tol=comparable(a,tol)
+  b,_=comparable(b)
+  if tol==0:
+    _,ia,ib=np.intersect1d(a,b,assume_unique=False,return_indices=True)
+    return ia,ib
+  ia=np.argsort(a,kind='stable')
+  ib=np.argsort(b,kind='stable')
+  sa,sb=a[ia],b[ib]
+  if len(sb)==0:
+    return ia[:0],ib[:0]
+  #nearest value of b to each value of a
+  k=np.searchsorted(sb,sa)
+  lo=np.clip(k-1,0,len(sb)-1)
+  hi=np.clip(k,0,len(sb)-1)
+  k=np.where(np.abs(sa-sb[lo])<=np.abs(sb[hi]-sa),lo,hi)
+  dist=np.abs(sb[k]-sa)
+  ok=np.flatnonzero(dist<=tol)
+  #each value of b (and of a) only once, keeping the closest pairs
+  ok=ok[np.argsort(dist[ok],kind='stable')]
+  _,first=np.unique(k[ok],return_index=True)
+  ok=ok[first]
+  _,first=np.unique(sa[ok],return_index=True)
+  ok=np.sort(ok[first])
+  return ia[ok],ib[k[ok]]
+
+#returns the matched x values (those of a) and the differences between the y values of series a and b
+def difference(xa,ya,xb,yb,tol=0):
+  ia,ib=match(xa,xb,tol)
+  return np.asarray(xa)[ia],np.asarray(ya)[ia]-np.asarray(yb)[ib]
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+#####################
+# batch.py
+#   Runs many plot jobs (each one a list of command line arguments) in the same process or in a pool
+#   of processes, so that modules are imported only once and the data of files shared between jobs is
+#   parsed only once per process
+#####################
+
+import os
+import json
+import shlex
+import traceback
+import collections
+import concurrent.futures
+
+#returns the list of jobs in the manifest; each job is a list of command line arguments; the manifest is
+#either json or yaml (a list of jobs, each given as a list of arguments or as a single string) or plain
+#text (one job per line, empty lines and lines starting with '#' are ignored)
+def read_manifest(filename):
+  ext=os.path.splitext(filename)[-1].lower()
+  with open(filename,'r') as f:
+    if ext=='.json':
+      jobs=json.load(f)
+    elif ext in ('.yaml','.yml'):
+      try:
+        import yaml
+      except ImportError:
+        raise ImportError(f"Need the PyYAML package to read {filename}, consider using a json or plain text manifest.")
+      jobs=yaml.safe_load(f)
+    else:
+      jobs=[l for l in f.read().splitlines() if l.strip() and not l.strip().startswith('#')]
+  if not isinstance(jobs,list):
+    raise ValueError(f"Expecting a list of jobs in {filename}, not {type(jobs)}.")
+  return [shlex.split(j) if isinstance(j,str) else [str(a) for a in j] for j in jobs]
+
+#returns the values of the option (given as -o VALUE, --option VALUE or --option=VALUE) in args
+def option_values(args,*names):
+  out=[]
+  for i,a in enumerate(args):
+    if a in names and i+1<len(args):
+      out.append(args[i+1])
+    elif a.startswith('--') and a.split('=',1)[0] in names:
+      out.append(a.split('=',1)[1])
+  return out
+
+#splits the jobs into groups that plot the same files, so that their data is parsed once
+def group_jobs(jobs):
+  groups=collections.OrderedDict()
+  for j in jobs:
+    groups.setdefault(tuple(option_values(j,'-f','--files')),[]).append(j)
+  return list(groups.values())
+
+#runs func with each job (in order) and returns the list of failed jobs and the count of the values returned by func
+def run_group(func,jobs):
+  failed=[]
+  results=collections.Counter()
+  for j in jobs:
+    try:
+      results[func(j)]+=1
+    except SystemExit as e:
+      #argparse errors and the like
+      if e.code:
+        failed.append(j)
+    except Exception:
+      traceback.print_exc()
+      failed.append(j)
+  return failed,results
+
+#runs func with all jobs, in nprocs processes (or in this process if nprocs is 1), and returns the list of
+#failed jobs and the count of the values returned by func
+def run(func,jobs,nprocs=1):
+  groups=group_jobs(jobs)
+  if nprocs<=1 or len(groups)==1:
+    out=[run_group(func,g) for g in groups]
+  else:
+    with concurrent.futures.ProcessPoolExecutor(max_workers=nprocs) as pool:
+      out=list(pool.map(run_group,[func]*len(groups),groups))
+  failed=[]
+  results=collections.Counter()
+  for f,r in out:
+    failed+=f
+    results.update(r)
+  return failed,results
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+
+#####################
+# column_cache.py
+#   On-disk cache of the columns parsed by column_reader.py, stored as raw memory-mappable arrays that grow
+#   as data is appended to the files
+#####################
+
+import os
+import json
+import fcntl
+import shutil
+import hashlib
+import collections
+import numpy as np
+import column_reader as cr
+
+#bump this whenever the parsing in column_reader.py changes the way data is represented
+CACHE_VERSION=3
+#default cache size limit, in MB
+DEFAULT_CACHE_SIZE=1024
+#default size limit of the in-memory cache, in MB
+DEFAULT_MEMORY_CACHE_SIZE=1024
+#size of the chunks read when hashing files
+HASH_CHUNK_SIZE=2**24
+
+#default cache location, honoring XDG_CACHE_HOME
+def default_cache_dir():
+  return os.path.join(os.environ.get('XDG_CACHE_HOME',os.path.join(os.path.expanduser('~'),'.cache')),'plot-files')
+
+#the cache key depends on the file (path) and on the column layout requested from it; the entry of the key
+#keeps track of the part of the file that was parsed (see update)
+def cache_key(filename,tcol,cols,x_date_format=None):
+  key=repr((CACHE_VERSION,os.path.abspath(filename),tcol,tuple(cols),x_date_format))
+  return hashlib.sha1(key.encode()).hexdigest()
+
+#returns the metadata of the entry in directory d, or None if there is none
+def read_meta(d):
+  try:
+    with open(os.path.join(d,'meta.json'),'r') as f:
+      return json.load(f)
+  except (OSError,ValueError):
+    return None
+
+#saves the metadata of the entry in directory d; this is done last, so its existence means the entry is complete
+def write_meta(d,meta):
+  tmp=os.path.join(d,f"meta.{os.getpid()}.tmp.json")
+  with open(tmp,'w') as f:
+    json.dump(meta,f)
+  os.replace(tmp,os.path.join(d,'meta.json'))
+
+#returns the memory-mapped t and y arrays of the entry in directory d, as described in meta
+def load(d,meta):
+  out=[]
+  for n in ('t','y'):
+    dtype=np.lib.format.descr_to_dtype(meta[n]['descr'])
+    shape=tuple(meta[n]['shape'])
+    if shape[0]==0:
+      out.append(np.empty(shape,dtype=dtype))
+    else:
+      out.append(np.memmap(os.path.join(d,f"{n}.raw"),dtype=dtype,mode='r',shape=shape))
+  return tuple(out)
+
+#updates the sha1 object h (a new one if None) with bytes start to end of filename and returns it
+def hash_bytes(filename,start,end,h=None):
+  if h is None:
+    h=hashlib.sha1()
+  with open(filename,'rb') as f:
+    f.seek(start)
+    while start<end:
+      chunk=f.read(min(HASH_CHUNK_SIZE,end-start))
+      if not chunk:
+        break
+      h.update(chunk)
+      start+=len(chunk)
+  return h
+
+#returns the size, mtime, inode and the sha1 of the file up to offset, used to check that the file did not
+#change up to there; h is the sha1 object of the first prev bytes of the file, if known
+def file_state(filename,offset,h=None,prev=0):
+  st=os.stat(filename)
+  return {
+    'size': st.st_size,
+    'mtime_ns': st.st_mtime_ns,
+    'ino': st.st_ino,
+    'offset': offset,
+    'sha1': hash_bytes(filename,prev,offset,h).hexdigest(),
+  }
+
+#returns the position after the last line break of filename between offset and end, or offset if there is none
+def last_line_end(filename,offset,end):
+  with open(filename,'rb') as f:
+    pos=end
+    while pos>offset:
+      start=max(offset,pos-2**16)
+      f.seek(start)
+      i=f.read(pos-start).rfind(b'\n')
+      if i>=0:
+        return start+i+1
+      pos=start
+  return offset
+
+#returns the offset up to which the file is the same as when the entry with meta was saved, or 0 if the file
+#has to be parsed again from the start, and the sha1 object of the file up to that offset (None if it was not
+#needed); files that did not grow are only the same if their mtime did not change either, files that grew are
+#only the same if everything that was cached is still there, unchanged (data was appended to them)
+def valid_offset(filename,meta):
+  if meta is None:
+    return 0,None
+  st=os.stat(filename)
+  if st.st_ino!=meta['ino']:
+    return 0,None
+  if st.st_size==meta['size'] and st.st_mtime_ns==meta['mtime_ns']:
+    return meta['offset'],None
+  if st.st_size<=meta['size']:
+    return 0,None
+  h=hash_bytes(filename,0,meta['offset'])
+  if h.hexdigest()!=meta.get('sha1'):
+    return 0,None
+  return meta['offset'],h
+
+#returns True if the entry of key has data of filename that can be used as it is or after parsing what was
+#appended to filename (the whole file is checked later, see valid_offset)
+def is_cached(cache_dir,key,filename):
+  meta=read_meta(os.path.join(cache_dir,key))
+  if meta is None:
+    return False
+  st=os.stat(filename)
+  return st.st_ino==meta['ino'] and (st.st_size>meta['size'] or st.st_mtime_ns==meta['mtime_ns'])
+
+#receives the blocks yielded by column_reader.read_blocks and appends them to the t and y arrays of the entry in
+#directory d (described by meta, None for a new entry); the blocks are written to disk as they arrive, so that
+#memory usage does not depend on the file size; new entries are written to temporary files, so that other
+#processes can keep using the arrays they memory-mapped
+class BlockWriter:
+  def __init__(self,d,meta=None):
+    self.dir=d
+    self.meta=meta
+    self.dtype={}
+    self.shape={}
+    self.raw={}
+    for n in ('t','y'):
+      if meta is None:
+        self.raw[n]=open(self.tmp(n),'wb')
+      else:
+        self.dtype[n]=np.lib.format.descr_to_dtype(meta[n]['descr'])
+        self.shape[n]=tuple(meta[n]['shape'])
+        self.raw[n]=open(os.path.join(d,f"{n}.raw"),'r+b')
+        #drop whatever was left by appends that were interrupted
+        self.raw[n].truncate(self.nbytes(n))
+        self.raw[n].seek(0,os.SEEK_END)
+  def tmp(self,n):
+    return os.path.join(self.dir,f"{n}.{os.getpid()}.tmp.raw")
+  #size of the cached data of n, as described in meta
+  def nbytes(self,n):
+    return int(np.prod(self.meta[n]['shape']))*np.lib.format.descr_to_dtype(self.meta[n]['descr']).itemsize
+  def __call__(self,t,y):
+    for n,a in (('t',t),('y',y)):
+      #the dtype of empty blocks is not meaningful
+      if len(a)==0:
+        continue
+      if n in self.dtype and a.dtype!=self.dtype[n]:
+        raise ValueError(f"inconsistent dtype of the cached data: {a.dtype} and {self.dtype[n]}")
+      self.dtype[n]=a.dtype
+      self.shape[n]=(self.shape.get(n,(0,))[0]+a.shape[0],)+a.shape[1:]
+      self.raw[n].write(np.ascontiguousarray(a).tobytes())
+  #saves the metadata of the entry, with the state of the file (see file_state); t_empty and y_empty give the
+  #dtype and shape of the arrays if there was no data at all
+  def close(self,state,t_empty,y_empty):
+    meta=dict(state)
+    for n,e in (('t',t_empty),('y',y_empty)):
+      self.raw[n].close()
+      self.dtype.setdefault(n,e.dtype)
+      self.shape.setdefault(n,e.shape)
+      meta[n]={'descr': np.lib.format.dtype_to_descr(self.dtype[n]), 'shape': list(self.shape[n])}
+      if self.meta is None:
+        os.replace(self.tmp(n),os.path.join(self.dir,f"{n}.raw"))
+    write_meta(self.dir,meta)
+    return meta
+  #removes the temporary files (or what was appended)
+  def abort(self):
+    for n,f in self.raw.items():
+      f.close()
+      if self.meta is None:
+        if os.path.isfile(self.tmp(n)):
+          os.remove(self.tmp(n))
+      else:
+        os.truncate(os.path.join(self.dir,f"{n}.raw"),self.nbytes(n))
+
+#returns (mtime,size,path) of all cache entries
+def entries(cache_dir):
+  out=[]
+  if not os.path.isdir(cache_dir):
+    return out
+  for k in os.listdir(cache_dir):
+    d=os.path.join(cache_dir,k)
+    if not os.path.isdir(d):
+      continue
+    try:
+      size=sum(os.path.getsize(os.path.join(d,f)) for f in os.listdir(d))
+      out.append((os.path.getmtime(d),size,d))
+    except OSError:
+      #entry removed by some other process in the meantime
+      continue
+  return out
+
+#removes the least recently used entries until the cache is no larger than max_size MB; keep is never removed
+def evict(cache_dir,max_size,keep=None):
+  e=sorted(entries(cache_dir))
+  total=sum(i[1] for i in e)
+  for _,size,d in e:
+    if total<=max_size*1024**2:
+      break
+    if keep is not None and os.path.basename(d)==keep:
+      continue
+    shutil.rmtree(d,ignore_errors=True)
+    total-=size
+
+#removes all cache entries
+def clear(cache_dir):
+  for _,_,d in entries(cache_dir):
+    shutil.rmtree(d,ignore_errors=True)
+
+#locks directory d (until the returned file is closed), so that only one process updates it at a time
+def lock(d):
+  f=open(os.path.join(d,'lock'),'w')
+  fcntl.flock(f,fcntl.LOCK_EX)
+  return f
+
+#brings the entry of key up to date with filename and returns its t and y arrays (memory-mapped) and the
+#offset in filename up to which they were parsed; only what was appended to filename since the entry was
+#saved is parsed (everything if the file changed in any other way, including edits that kept its size); the
+#whole file is hashed to check that, which is much faster than parsing it
+def update(cache_dir,key,filename,tcol,cols,x_date_format=None):
+  d=os.path.join(cache_dir,key)
+  os.makedirs(d,exist_ok=True)
+  with lock(d):
+    meta=read_meta(d)
+    offset,h=valid_offset(filename,meta)
+    if offset==0:
+      meta=None
+    st=os.stat(filename)
+    if meta is not None and st.st_size==meta['size'] and st.st_mtime_ns==meta['mtime_ns']:
+      #mark as recently used
+      os.utime(d)
+      return load(d,meta)+(offset,)
+    #only complete lines are cached, the last one may still be being written
+    end=last_line_end(filename,offset,st.st_size)
+    writer=BlockWriter(d,meta)
+    try:
+      for tb,yb in cr.read_blocks(filename,tcol,cols,x_date_format,offset=offset,end=end):
+        writer(tb,yb)
+      t_empty,y_empty=cr.parse_lines([],tcol,cols,x_date_format)
+      meta=writer.close(file_state(filename,end,h,offset),t_empty,y_empty)
+    except BaseException:
+      writer.abort()
+      raise
+  return load(d,meta)+(end,)
+
+#same as column_reader.read_window but retrieves the parsed columns from cache_dir, if available, or parses and
+#saves them there otherwise (if the file grew since it was cached, only the new data is parsed); the cache
+#always has float64 data, which is converted to dtype (if given) when returned; complete files and windows of
+#sorted data are returned as views of the memory-mapped cache, without copying them; files that are not cached
+#yet are not cached when end_x is given, so that reading stops there (as with column_reader.read_window) instead
+#of parsing the complete file, at the cost of parsing it again (up to end_x) for the next plot
+def read_window(filename,tcol,cols,x_date_format=None,start_x=None,end_x=None,cache_dir=None,max_size=DEFAULT_CACHE_SIZE,dtype=None):
+  return read_window_cached(filename,tcol,cols,x_date_format,start_x,end_x,cache_dir,max_size,dtype)[:2]
+
+#same as read_window, also returns whether the data is in the cache (False if it was read without caching it)
+def read_window_cached(filename,tcol,cols,x_date_format=None,start_x=None,end_x=None,cache_dir=None,max_size=DEFAULT_CACHE_SIZE,dtype=None):
+  #pipes and the like cannot be cached
+  if not os.path.isfile(filename):
+    return cr.read_window(filename,tcol,cols,x_date_format,start_x,end_x,dtype=dtype)+(False,)
+  if cache_dir is None:
+    cache_dir=default_cache_dir()
+  key=cache_key(filename,tcol,cols,x_date_format)
+  if end_x is not None and not is_cached(cache_dir,key,filename):
+    return cr.read_window(filename,tcol,cols,x_date_format,start_x,end_x,dtype=dtype)+(False,)
+  try:
+    t,y,offset=update(cache_dir,key,filename,tcol,cols,x_date_format)
+    evict(cache_dir,max_size,keep=key)
+  except (OSError,ValueError) as e:
+    print(f"WARNING: could not cache the data of {filename}: {e}")
+    return cr.read_window(filename,tcol,cols,x_date_format,start_x,end_x,dtype=dtype)+(False,)
+  #the last line, if incomplete, is not cached
+  if os.path.getsize(filename)>offset:
+    tr,yr=cr.read_window(filename,tcol,cols,x_date_format,offset=offset)
+    if len(tr)>0:
+      t=np.concatenate((t,tr))
+      y=np.concatenate((y,yr))
+  if start_x is not None or end_x is not None:
+    idx=np.flatnonzero(cr.window_index(t,start_x,end_x))
+    if len(idx)>0 and idx[-1]-idx[0]+1==len(idx):
+      idx=slice(idx[0],idx[-1]+1)
+    t,y=t[idx],y[idx]
+  if dtype is not None:
+    y=y.astype(dtype,copy=False)
+  return t,y,True
+
+#in-memory LRU of parsed data, for when several plots are made in the same process
+class MemoryCache:
+  def __init__(self,max_size=DEFAULT_MEMORY_CACHE_SIZE):
+    self.max_size=max_size
+    self.data=collections.OrderedDict()
+  #the key depends on the file (path, size, mtime) and on whatever else is given; pipes and the like
+  #cannot be read twice, so they have no key (None)
+  @staticmethod
+  def key(filename,*args):
+    if not os.path.isfile(filename):
+      return None
+    s=os.stat(filename)
+    return (os.path.abspath(filename),s.st_size,s.st_mtime_ns)+args
+  #returns the value of key, or None if not available
+  def get(self,key):
+    if key is None or not key in self.data:
+      return None
+    self.data.move_to_end(key)
+    return self.data[key][1]
+  #saves the value (a tuple of numpy arrays) of key, removing the least recently used entries if needed
+  def put(self,key,value):
+    if key is None:
+      return
+    #memory-mapped arrays do not really take memory
+    size=sum(a.nbytes for a in value if not isinstance(a,np.memmap))
+    self.data[key]=(size,value)
+    self.data.move_to_end(key)
+    total=sum(i[0] for i in self.data.values())
+    while total>self.max_size*1024**2 and len(self.data)>1:
+      _,(size,_)=self.data.popitem(last=False)
+      total-=size
+  def clear(self):
+    self.data.clear()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+#####################
+# column_reader.py
+#   Parses column-wise ASCII files into NumPy arrays, block by block, tokenizing each line only once
+#####################
+
+import io
+import os
+import re
+import warnings
+import numpy as np
+import line_index as li
+import date_parsing as dp
+
+#same separators as re.split('[\t, ]+',l), used in plot-files.py since forever
+SEP_REGEX=re.compile('[\t, ]+')
+SEP_TRANSLATION=str.maketrans({'\t':' ',',':' '})
+#lines starting with a separator have an empty first column (that is how re.split behaves)
+LEADING_SEP_REGEX=re.compile('^ ',re.MULTILINE)
+#size of the blocks of text parsed at once, in bytes
+BLOCK_SIZE=2**24
+
+#converts the t-column tokens to numbers (float) or dates (datetime64, see date_parsing.py), dropping
+#the rows where that is not possible
+def parse_t(tokens,y,x_date_format=None):
+  if x_date_format is None:
+    return np.array(tokens,dtype=float),y
+  t=dp.parse_dates(tokens,x_date_format)
+  idx=~np.isnat(t)
+  if idx.all():
+    return t,y
+  return t[idx],y[idx]
+
+#slow path: tokenize each line once and skip those where any of the requested columns cannot be parsed
+def parse_lines(lines,tcol,cols,x_date_format=None):
+  t=[]
+  y=[]
+  for l in lines:
+    dl=SEP_REGEX.split(l)
+    try:
+      if x_date_format is None:
+        ti=float(dl[tcol])
+      else:
+        ti=dl[tcol]
+      yi=[float(dl[c]) for c in cols]
+    except (ValueError,IndexError):
+      continue
+    t.append(ti)
+    y.append(yi)
+  return parse_t(t,np.array(y,dtype=float).reshape(-1,len(cols)),x_date_format)
+
+#numpy.loadtxt of the text, without the warnings about comments and empty lines
+def loadtxt(text,usecols,dtype,ndmin):
+  with warnings.catch_warnings():
+    warnings.simplefilter('ignore',UserWarning)
+    return np.loadtxt(io.StringIO(text),usecols=usecols,dtype=dtype,comments='#',ndmin=ndmin)
+
+#fast path: let numpy parse the whole text at once; raises ValueError if there's anything unexpected in it
+def parse_text(text,tcol,cols,x_date_format=None):
+  #separators are normalized to a single type so that numpy can split the columns
+  text=text.translate(SEP_TRANSLATION)
+  #leading separators shift the columns, numpy would ignore them
+  if LEADING_SEP_REGEX.search(text):
+    raise ValueError('leading separators')
+  if not text.strip():
+    return parse_lines([],tcol,cols,x_date_format)
+  if x_date_format is None:
+    d=loadtxt(text,(tcol,)+tuple(cols),float,2)
+    return d[:,0],d[:,1:]
+  #dates are read as strings and converted in bulk
+  t=loadtxt(text,(tcol,),str,1)
+  y=loadtxt(text,tuple(cols),float,2)
+  return parse_t(t,y,x_date_format)
+
+#returns the t-column (as a 1-D array) and the cols-columns (as a 2-D array, one column per entry in cols) of the text
+def parse_columns(text,tcol,cols,x_date_format=None):
+  try:
+    return parse_text(text,tcol,cols,x_date_format)
+  except (ValueError,IndexError):
+    pass
+  return parse_lines(text.splitlines(),tcol,cols,x_date_format)
+
+#converts bytes read from a file to text, with universal newlines (same as reading in text mode)
+def decode(data):
+  if b'\r' in data:
+    data=data.replace(b'\r\n',b'\n').replace(b'\r',b'\n')
+  return data.decode()
+
+#yields the t-column and the cols-columns of consecutive blocks of filename, see parse_columns;
+#each block has about block_size bytes of text and always ends at a line break; only the nlines
+#lines from line start (0-based) onwards are read (None means until the end of the file); offset
+#and end (in bytes, offset must be at the start of a line) limit the part of the file that is read
+def read_blocks(filename,tcol,cols,x_date_format=None,block_size=BLOCK_SIZE,start=0,nlines=None,offset=0,end=None):
+  with open(filename, 'rb') as f:
+    if offset>0:
+      f.seek(offset)
+    if start>0:
+      #pipes and the like cannot be indexed
+      if os.path.isfile(filename) and offset==0:
+        offset,skip=li.seek(filename,start)
+        #offsets in the index are always at the start of a line
+        f.seek(offset)
+      else:
+        skip=start
+      for _ in range(skip):
+        f.readline()
+    while nlines is None or nlines>0:
+      size=block_size
+      if end is not None:
+        size=min(size,end-f.tell())
+        if size<=0:
+          break
+      data=f.read(size)
+      if not data:
+        break
+      if data[-1:]!=b'\n':
+        data+=f.readline() if end is None else f.readline(end-f.tell())
+      text=decode(data)
+      if nlines is not None:
+        n=text.count('\n')
+        if n>=nlines:
+          text='\n'.join(text.split('\n',nlines)[:nlines])
+        nlines-=n
+      yield parse_columns(text,tcol,cols,x_date_format)
+
+#returns the boolean index of start_x <= t <= end_x (None means no limit)
+def window_index(t,start_x=None,end_x=None):
+  idx=np.ones(len(t),dtype=bool)
+  if start_x is not None: idx&=(t>=start_x)
+  if   end_x is not None: idx&=(t<=end_x)
+  return idx
+
+#reads filename block by block and returns the t-column and the cols-columns with start_x <= t <= end_x
+#(None means no limit); if t is sorted, reading stops at the first block with t > end_x; all blocks
+#(before filtering) are passed to sink, if given, in which case the complete file is always read;
+#start, nlines, offset and end select the part of the file that is read, see read_blocks; the cols-columns
+#are converted to dtype (if given) block by block, so that the complete data is never kept as float64
+def read_window(filename,tcol,cols,x_date_format=None,start_x=None,end_x=None,block_size=BLOCK_SIZE,sink=None,start=0,nlines=None,offset=0,end=None,dtype=None):
+  t=[]
+  y=[]
+  is_sorted=True
+  last=None
+  for tb,yb in read_blocks(filename,tcol,cols,x_date_format,block_size,start,nlines,offset,end):
+    if sink is not None:
+      sink(tb,yb)
+    if len(tb)==0:
+      continue
+    if dtype is not None:
+      yb=yb.astype(dtype,copy=False)
+    #keep track of the ordering of the data read so far
+    if is_sorted:
+      is_sorted=(last is None or tb[0]>=last) and bool(np.all(tb[1:]>=tb[:-1]))
+    last=tb[-1]
+    #apply limits
+    idx=window_index(tb,start_x,end_x)
+    if idx.all():
+      t.append(tb)
+      y.append(yb)
+    elif idx.any():
+      t.append(tb[idx])
+      y.append(yb[idx])
+    #no need to read the rest of the file
+    if sink is None and is_sorted and end_x is not None and last>end_x:
+      break
+  if len(t)==0:
+    t,y=parse_lines([],tcol,cols,x_date_format)
+    return t,y if dtype is None else y.astype(dtype)
+  if len(t)==1:
+    return t[0],y[0]
+  return np.concatenate(t),np.concatenate(y)
+
+#reads filename and returns the t-column and the cols-columns, see parse_columns
+def read_columns(filename,tcol,cols,x_date_format=None):
+  return read_window(filename,tcol,cols,x_date_format)
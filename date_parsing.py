@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+#####################
+# date_parsing.py
+#   Converts arrays of date strings to datetime64 arrays in bulk: fixed-width numeric formats
+#   (including the ISO-like ones) are decoded straight from the characters, with NumPy; other
+#   formats are split into a date and a time of day, so that each distinct date (e.g. with month
+#   names) goes through datetime.strptime only once, and only what remains is parsed string by string
+#####################
+
+import re
+import numpy as np
+from datetime import datetime, timezone
+
+#resolution of the parsed dates
+DATE_DTYPE='datetime64[us]'
+NAT=np.datetime64('NaT','us')
+#width of the numeric strptime directives that can be decoded by slicing the characters ('f' is variable)
+FIXED_WIDTH={'Y':4,'y':2,'m':2,'d':2,'j':3,'H':2,'M':2,'S':2,'f':None}
+#one microsecond of each of the time directives
+TIME_US={'H':3600*10**6,'M':60*10**6,'S':10**6}
+#strptime directives of the date and of the time of day (see split_date_time), and those with names
+DATE_DIRECTIVES='aAbBdjmyYuwUWGV'
+TIME_DIRECTIVES='HIMSfpzZ'
+NAME_DIRECTIVES='aAbB'
+#start of the dates of formats without date (what strptime uses)
+EPOCH_1900=np.datetime64('1900-01-01','us')
+
+#splits the format into a list of (directive,position,width) and a list of (position,literal); returns
+#None if the format has anything that cannot be decoded by position (e.g. %b, %p or %z); width is the
+#total width of the string (if the format ends with %f, it is the width up to the fractional seconds)
+def fixed_width_layout(x_date_format):
+  fields=[]
+  literals=[]
+  pos=0
+  for m in re.finditer('%(.)|(.)',x_date_format,re.DOTALL):
+    d,l=m.groups()
+    #variable-width directives can only be at the end
+    if fields and fields[-1][2] is None:
+      return None
+    if d is None or d=='%':
+      literals.append((pos,l or '%'))
+      pos+=1
+    elif d in FIXED_WIDTH:
+      fields.append((d,pos,FIXED_WIDTH[d]))
+      if FIXED_WIDTH[d] is not None:
+        pos+=FIXED_WIDTH[d]
+    else:
+      return None
+  names=[f[0] for f in fields]
+  #repeated directives or day-of-year together with month/day are left to strptime
+  if len(set(names))!=len(names) or ('j' in names and ('m' in names or 'd' in names)):
+    return None
+  return fields,literals,pos
+
+#decodes the dates with a fixed-width layout (see fixed_width_layout) from their characters; returns
+#NaT for strings that do not fit the layout or are not valid dates
+def parse_fixed_width(dates,layout):
+  fields,literals,width=layout
+  n=len(dates)
+  out=np.full(n,NAT)
+  if n==0:
+    return out
+  lengths=np.char.str_len(dates)
+  if fields and fields[-1][2] is None:
+    #width of the fractional seconds is taken from the most common string length, all other must be the same
+    fwidth=int(np.bincount(lengths).argmax())-width
+    if not 1<=fwidth<=6:
+      return out
+    fields=fields[:-1]+[('f',width,fwidth)]
+    width+=fwidth
+  ok=(lengths==width)
+  try:
+    chars=np.frombuffer(dates.astype(f'S{width}').tobytes(),dtype=np.uint8).reshape(n,width)
+  except UnicodeEncodeError:
+    return out
+  for p,l in literals:
+    ok&=(chars[:,p]==ord(l))
+  #numeric value of each field
+  v={}
+  for d,p,w in fields:
+    digits=chars[:,p:p+w].astype(np.int64)-ord('0')
+    ok&=((digits>=0)&(digits<=9)).all(axis=1)
+    v[d]=digits@(10**np.arange(w-1,-1,-1,dtype=np.int64))
+  #year, same pivot as strptime for %y
+  if 'Y' in v:
+    year=v['Y']
+  elif 'y' in v:
+    year=np.where(v['y']<69,2000,1900)+v['y']
+  else:
+    year=np.full(n,1900,dtype=np.int64)
+  ok&=(year>=1)
+  #day
+  years=(year-1970).astype('datetime64[Y]')
+  if 'j' in v:
+    ok&=(v['j']>=1)&(v['j']<=366)
+    days=years.astype('datetime64[D]')+(v['j']-1)
+    ok&=(days.astype('datetime64[Y]')==years)
+  else:
+    month=v.get('m',np.ones(n,dtype=np.int64))
+    day  =v.get('d',np.ones(n,dtype=np.int64))
+    ok&=(month>=1)&(month<=12)&(day>=1)&(day<=31)
+    months=years.astype('datetime64[M]')+(month-1)
+    days=months.astype('datetime64[D]')+(day-1)
+    ok&=(days.astype('datetime64[M]')==months)
+  #time of day
+  us=np.zeros(n,dtype=np.int64)
+  for d,limit in (('H',24),('M',60),('S',60)):
+    if d in v:
+      ok&=(v[d]<limit)
+      us+=v[d]*TIME_US[d]
+  if 'f' in v:
+    us+=v['f']*10**(6-fwidth)
+  out[ok]=days[ok].astype(DATE_DTYPE)+us[ok].astype('timedelta64[us]')
+  return out
+
+#parses the dates with datetime.strptime, once for each distinct string; returns NaT for invalid ones
+def parse_strptime(dates,x_date_format):
+  memo={}
+  def parse(s):
+    try:
+      d=datetime.strptime(s,x_date_format)
+    except ValueError:
+      return None
+    #datetime64 has no time zones, so aware dates are represented in UTC
+    if d.tzinfo is not None:
+      d=d.astimezone(timezone.utc).replace(tzinfo=None)
+    return d
+  out=[memo[s] if s in memo else memo.setdefault(s,parse(s)) for s in dates.tolist()]
+  return np.array(out,dtype=DATE_DTYPE).reshape(-1)
+
+#splits the format into the format of the date, a separator and the format of the time of day (e.g. '%d-%b-%Y',
+#'-' and '%H:%M:%S'); returns None if there is no separator with only date directives before and only time
+#directives after it; the separator is not a letter or digit (except 'T' without names in the date), so that
+#it can only be found in the dates where the format has it; the number of separators in the date format is
+#also returned
+def split_date_time(x_date_format):
+  tokens=re.findall('%.|.',x_date_format,re.DOTALL)
+  for i,sep in enumerate(tokens):
+    if len(sep)!=1 or (sep.isalnum() and sep!='T'):
+      continue
+    date=[t[1] for t in tokens[:i] if len(t)==2 and t!='%%']
+    time=[t[1] for t in tokens[i+1:] if len(t)==2 and t!='%%']
+    if not date or not time or any(d not in DATE_DIRECTIVES for d in date) or any(d not in TIME_DIRECTIVES for d in time):
+      continue
+    if sep=='T' and any(d in NAME_DIRECTIVES for d in date):
+      continue
+    return ''.join(tokens[:i]),sep,tokens[:i].count(sep),''.join(tokens[i+1:])
+  return None
+
+#parses the dates with the format split by split_date_time: the date part of the strings is parsed once
+#for each distinct date and the time part is parsed as dates of 1900-01-01 (see parse_dates, which decodes
+#fixed-width numeric times straight from the characters)
+def parse_date_time(dates,parts):
+  date_format,sep,nsep,time_format=parts
+  index={}
+  day=np.empty(len(dates),dtype=np.int64)
+  time=[]
+  for i,s in enumerate(dates.tolist()):
+    p=s.split(sep,nsep+1)
+    if len(p)!=nsep+2:
+      day[i]=-1
+      time.append('')
+      continue
+    day[i]=index.setdefault(sep.join(p[:-1]),len(index))
+    time.append(p[-1])
+  days=np.append(parse_dates(list(index),date_format),NAT)
+  return days[day]+(parse_dates(time,time_format)-EPOCH_1900)
+
+#converts an array of strings to datetime64 (with NaT for the strings that are not valid dates)
+def parse_dates(dates,x_date_format):
+  dates=np.asarray(dates,dtype=str).reshape(-1)
+  layout=fixed_width_layout(x_date_format)
+  if layout is None:
+    parts=split_date_time(x_date_format)
+    if parts is None:
+      return parse_strptime(dates,x_date_format)
+    return parse_date_time(dates,parts)
+  out=parse_fixed_width(dates,layout)
+  #whatever does not fit the layout is handled by strptime (which is also the final judge of invalid dates)
+  bad=np.isnat(out)
+  if bad.any():
+    out[bad]=parse_strptime(dates[bad],x_date_format)
+  return out
+
+#converts a single date string to datetime64, also accepting ISO 8601 dates; raises ValueError if invalid
+def parse_date(date,x_date_format):
+  out=parse_dates([date],x_date_format)[0]
+  if np.isnat(out):
+    out=np.datetime64(date,'us')
+  return out
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+#####################
+# decimation.py
+#   Reduces the number of points of a series to what can actually be seen in a plot with a given
+#   number of horizontal pixels, preserving spikes (minmax) or the visual shape (lttb)
+#####################
+
+import warnings
+import numpy as np
+
+#available decimation methods
+METHODS=['minmax','lttb','none']
+#points per horizontal pixel kept by each method (minmax keeps the min and max of each pixel)
+POINTS_PER_PIXEL={'minmax':2,'lttb':3}
+
+#converts x (numbers or dates) to float, in log scale if requested (and possible)
+def numeric_x(x,logx=False):
+  x=np.asarray(x)
+  if np.issubdtype(x.dtype,np.datetime64):
+    x=x.astype('datetime64[us]').view(np.int64)
+  x=x.astype(float)
+  if logx:
+    #non-positive values are not visible in log scale, they are put together with the smallest positive value
+    pos=(x>0)
+    if pos.any():
+      x=np.log10(np.where(pos,x,x[pos].min()))
+  return x
+
+#returns the positions of the min and max of y (and of the first and last points) within each of the
+#nbuckets intervals of equal width between x[0] and x[-1] (x must be sorted)
+def minmax_index(x,y,nbuckets):
+  n=len(x)
+  edges=np.linspace(x[0],x[-1],nbuckets+1)[1:-1]
+  #empty buckets are dropped
+  starts=np.unique(np.concatenate(([0],np.searchsorted(x,edges,side='left'))))
+  starts=starts[starts<n]
+  bucket=np.repeat(np.arange(len(starts)),np.diff(np.append(starts,n)))
+  keep=np.zeros(n,dtype=bool)
+  keep[[0,-1]]=True
+  for reduce in (np.fmin,np.fmax):
+    #first position of each bucket with the extreme value (buckets with only NaNs have none)
+    pos=np.flatnonzero(y==reduce.reduceat(y,starts)[bucket])
+    keep[pos[np.diff(bucket[pos],prepend=-1)>0]]=True
+  return np.flatnonzero(keep)
+
+#returns the positions of the npoints picked by the Largest-Triangle-Three-Buckets algorithm
+#(Steinarsson, 2013, Downsampling Time Series for Visual Representation, MSc thesis, U. Iceland)
+def lttb_index(x,y,npoints):
+  n=len(x)
+  every=(n-2)/(npoints-2)
+  keep=np.empty(npoints,dtype=np.int64)
+  keep[0]=0
+  keep[-1]=n-1
+  a=0
+  for i in range(npoints-2):
+    start=int(i*every)+1
+    end  =int((i+1)*every)+1
+    #average of the next bucket (the last bucket is the last point)
+    if i==npoints-3:
+      nstart,nend=n-1,n
+    else:
+      nstart,nend=end,int((i+2)*every)+1
+    with warnings.catch_warnings():
+      #buckets with only NaNs
+      warnings.simplefilter('ignore',RuntimeWarning)
+      avgx=np.nanmean(x[nstart:nend])
+      avgy=np.nanmean(y[nstart:nend])
+    area=np.abs((x[a]-avgx)*(y[start:end]-y[a])-(x[a]-x[start:end])*(avgy-y[a]))
+    a=start+(int(np.nanargmax(area)) if np.isfinite(area).any() else 0)
+    keep[i+1]=a
+  return np.unique(keep)
+
+#returns the positions of the points of x,y to plot with the given method in npixels horizontal pixels;
+#all positions are returned if there are not that many points or x is not sorted
+def decimate_index(x,y,npixels,method='minmax',logx=False):
+  n=len(x)
+  if method=='none' or n<=POINTS_PER_PIXEL.get(method,1)*npixels:
+    return np.arange(n)
+  x=numeric_x(x,logx)
+  if not np.all(x[1:]>=x[:-1]):
+    return np.arange(n)
+  y=np.asarray(y,dtype=float)
+  if method=='minmax':
+    return minmax_index(x,y,int(npixels))
+  if method=='lttb':
+    return lttb_index(x,y,int(POINTS_PER_PIXEL[method]*npixels))
+  raise ValueError(f"unknown decimation method '{method}', expecting one of {METHODS}")
+
+#same as decimate_index, for a pandas series (returns the decimated series)
+def decimate_series(s,npixels,method='minmax',logx=False):
+  idx=decimate_index(s.index,s.values,npixels,method,logx)
+  if len(idx)==len(s):
+    return s
+  return s.iloc[idx]
+
+#same as decimate_series, for the list of series defining a band (e.g. the confidence interval), with
+#the same points picked in all of them
+def decimate_band(band,npixels,method='minmax',logx=False):
+  idx=np.unique(np.concatenate([decimate_index(s.index,s.values,npixels,method,logx) for s in band]))
+  if len(idx)==len(band[0]):
+    return band
+  return [s.iloc[idx] for s in band]
+
+#returns the positions of the points in each level of detail of x,y, from the coarsest (decimated to
+#npixels) to the finest (all points), each level having factor times more pixels than the previous
+def pyramid_index(x,y,npixels,method='minmax',logx=False,factor=4):
+  levels=[]
+  while True:
+    levels.append(decimate_index(x,y,npixels,method,logx))
+    if len(levels[-1])==len(x):
+      return levels
+    #the next level would not be much smaller than the complete data
+    if len(levels[-1])*factor>=len(x):
+      levels.append(np.arange(len(x)))
+      return levels
+    npixels*=factor
@@ -1,35 +1,34 @@
 import base64
+import html
 import io
 import pathlib
-from typing import Optional, Union
+from typing import Dict, List, Optional, TextIO, Union
 
-import bs4
 import numpy as np
 import pandas as pd
 import PIL
 import plotly
-from bs4 import BeautifulSoup
 from PIL import Image
 
 from htmlcreator.css import CSS
 
-_DEFAULT_HTML = (
-    '<!DOCTYPE html>'
-    '<html lang="en">'
-    '<head><meta charset="UTF-8"></head>'
-    '<body></body>'
-    '</html>'
-)
+_HTML_BEGIN = '<!DOCTYPE html>\n<html lang="en">\n'
+_HTML_END = '</html>\n'
 
 HEADER_LEVEL_VALUES = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
 TEXT_ALIGN_VALUES = {'left', 'center', 'right', 'justify', 'inherit', 'start', 'end'}
 
 
 class HTMLDocument:
-    """HTML Document class."""
+    """HTML Document class.
+
+    The body is kept as a list of HTML fragments, which are written to the
+    file one after the other, without being parsed again.
+    """
 
     def __init__(self) -> None:
-        self.soup = BeautifulSoup(_DEFAULT_HTML, 'html.parser')
+        self.title: Optional[str] = None
+        self.body: List[str] = []
         self.css = CSS()
 
     def add_header(
@@ -42,9 +41,7 @@ class HTMLDocument:
         assert level in HEADER_LEVEL_VALUES, level
         assert align in TEXT_ALIGN_VALUES, align
         style = f'text-align: {align};'
-        header_tag = self.soup.new_tag(level, style=style)
-        header_tag.string = header
-        self.soup.body.append(header_tag)
+        self.add_html(_tag(level, {'style': style}, header))
 
     def add_paragraph(
         self,
@@ -56,20 +53,16 @@ class HTMLDocument:
         """Add text paragraph."""
         assert align in TEXT_ALIGN_VALUES, align
         style = f'font-size:{size}; text-indent: {indent}; text-align: {align};'
-        p_tag = self.soup.new_tag('p', style=style)
-        p_tag.string = text
-        self.soup.body.append(p_tag)
+        self.add_html(_tag('p', {'style': style}, text))
 
     def add_line_break(self) -> None:
         """Add line break."""
-        br_tag = self.soup.new_tag('br')
-        self.soup.body.append(br_tag)
+        self.add_html(_tag('br'))
 
     def add_page_break(self) -> None:
         """Add page break."""
         style = 'page-break-after: always;'
-        pb_tag = self.soup.new_tag('p', style=style)
-        self.soup.body.append(pb_tag)
+        self.add_html(_tag('p', {'style': style}, ''))
 
     def add_image(
         self,
@@ -122,43 +115,75 @@ class HTMLDocument:
             raise TypeError(
                 f'df is of type {type(df)}, but it should be of type {pd.DataFrame}.'
             )
-        div_tag = self.soup.new_tag('div', attrs={'class': 'pandas-dataframe'})
+        from bs4 import BeautifulSoup
+
         table = BeautifulSoup(str(df.to_html()), 'html.parser')
         self._simplify_double_thead_tr(table)
-        div_tag.append(table)
-        self.soup.body.append(div_tag)
+        self.add_html(f'<div class="pandas-dataframe">{table}</div>')
+
+    def add_plotly_figure(
+        self,
+        fig: plotly.graph_objs.Figure,
+        post_script: Optional[Union[str, List[str]]] = None,
+        dtype: Optional[str] = None,
+    ) -> None:
+        """Add plotly figure, optionally with JavaScript run after plot creation.
 
-    def add_plotly_figure(self, fig: plotly.graph_objs.Figure) -> None:
-        """Add plotly figure."""
+        Numeric trace arrays are embedded by plotly as base64 typed arrays;
+        if dtype is given (e.g. 'float32'), the y arrays of the traces of fig
+        are converted to it beforehand, so that they take less space.
+        """
         if not isinstance(fig, plotly.graph_objs.Figure):
             raise TypeError(
                 f'fig is of type {type(fig)}, '
                 f'but it should be {plotly.graph_objs.Figure}.'
             )
+        if dtype is not None:
+            for trace in fig.data:
+                if getattr(trace, 'y', None) is not None:
+                    trace.y = np.asarray(trace.y, dtype=dtype)
         plotly_figure_html = plotly.io.to_html(
             fig=fig,
             full_html=False,
             include_plotlyjs='cdn',
+            post_script=post_script,
         )
-        div_tag = self.soup.new_tag('div', attrs={'class': 'plotly-figure'})
-        plotly_figure = BeautifulSoup(str(plotly_figure_html), 'html.parser')
-        div_tag.append(plotly_figure)
-        self.soup.body.append(div_tag)
+        self.add_html(f'<div class="plotly-figure">{plotly_figure_html}</div>')
+
+    def add_html(self, fragment: str) -> None:
+        """Add pre-rendered HTML fragment to the body, as is."""
+        self.body.append(str(fragment))
 
     def set_title(self, title: str) -> None:
         """Set document title."""
-        for child in list(self.soup.head.children):
-            if child.name == 'title':
-                child.decompose()
-        title_tag = self.soup.new_tag('title')
-        title_tag.string = str(title)
-        self.soup.head.append(title_tag)
-
-    def write(self, filepath: str) -> None:
-        """Save document to filepath."""
-        self._set_style()
+        self.title = str(title)
+
+    def write(self, filepath: str, prettify: bool = False) -> None:
+        """Save document to filepath, optionally indented (slow for large documents)."""
         with io.open(str(filepath), 'w', encoding='utf8') as f:
-            f.write(str(self.soup.prettify()))
+            if prettify:
+                from bs4 import BeautifulSoup
+
+                buff = io.StringIO()
+                self._write(buff)
+                f.write(BeautifulSoup(buff.getvalue(), 'html.parser').prettify())
+            else:
+                self._write(f)
+
+    def _write(self, f: TextIO) -> None:
+        """Write document to file object, one fragment at a time."""
+        f.write(_HTML_BEGIN)
+        f.write('<head>\n')
+        f.write(_tag('meta', {'charset': 'UTF-8'}) + '\n')
+        if self.title is not None:
+            f.write(_tag('title', content=self.title) + '\n')
+        f.write(_tag('style', content=str(self.css), escape=False) + '\n')
+        f.write('</head>\n<body>\n')
+        for fragment in self.body:
+            f.write(fragment)
+            f.write('\n')
+        f.write('</body>\n')
+        f.write(_HTML_END)
 
     def _add_image_tag(
         self,
@@ -172,14 +197,14 @@ class HTMLDocument:
         style = 'border:1px solid #021a40; margin: 3px 3px;'
         if pixelated:
             style += ' image-rendering: pixelated;'
-        img_tag = self.soup.new_tag('img', src=src, style=style)
+        attrs = {'src': src, 'style': style}
         if title:
-            img_tag.attrs['title'] = str(title)
+            attrs['title'] = str(title)
         if height:
-            img_tag.attrs['height'] = str(height)
+            attrs['height'] = str(height)
         if width:
-            img_tag.attrs['width'] = str(width)
-        self.soup.body.append(img_tag)
+            attrs['width'] = str(width)
+        self.add_html(_tag('img', attrs))
 
     def _encode_image(
         self,
@@ -212,16 +237,7 @@ class HTMLDocument:
         image_encoded_str = encoded.decode('utf-8')
         return image_encoded_str
 
-    def _set_style(self) -> None:
-        """Set document style."""
-        for child in list(self.soup.head.children):
-            if child.name == 'style':
-                child.decompose()
-        style_tag = self.soup.new_tag('style')
-        style_tag.string = str(self.css)
-        self.soup.head.append(style_tag)
-
-    def _simplify_double_thead_tr(self, table: bs4.BeautifulSoup) -> None:
+    def _simplify_double_thead_tr(self, table: 'bs4.BeautifulSoup') -> None:
         """Simplify a double header row in HTML table generated by pandas."""
         thead = table.find('thead')
         tr_list = thead.find_all('tr')
@@ -239,3 +255,21 @@ class HTMLDocument:
             if not th1.string:
                 th1.string = th2.string
         tr2.decompose()
+
+
+def _tag(
+    name: str,
+    attrs: Optional[Dict[str, str]] = None,
+    content: Optional[str] = None,
+    escape: bool = True,
+) -> str:
+    """Render tag with (escaped) attributes and content; no closing tag if content is None."""
+    attrs_str = ''.join(
+        f' {key}="{html.escape(str(value), quote=True)}"'
+        for key, value in (attrs or {}).items()
+    )
+    if content is None:
+        return f'<{name}{attrs_str}/>'
+    if escape:
+        content = html.escape(str(content), quote=False)
+    return f'<{name}{attrs_str}>{content}</{name}>'
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+#####################
+# line_index.py
+#   Sparse index with the byte offset of every INDEX_STEP-th line of a file, saved next to it
+#   so that jumping to a line far into the file is a seek rather than a scan; the index is
+#   rebuilt whenever the size or modification time of the file changes
+#####################
+
+import os
+import argparse
+import numpy as np
+
+#one offset is saved for every this many lines
+INDEX_STEP=10000
+#size of the chunks read when building the index, in bytes
+CHUNK_SIZE=2**26
+
+#the index of dir/file is saved in dir/.file.lineidx
+def index_filename(filename):
+  d,f=os.path.split(os.path.abspath(filename))
+  return os.path.join(d,f".{f}.lineidx")
+
+#returns the number of lines in filename and the byte offsets of lines 0, step, 2*step, ...
+def build(filename,step=INDEX_STEP):
+  offsets=[np.zeros(1,dtype=np.int64)]
+  nlines=0
+  pos=0
+  last=b'\n'
+  with open(filename,'rb') as f:
+    while True:
+      chunk=f.read(CHUNK_SIZE)
+      if not chunk:
+        break
+      #line nlines+i+1 starts right after the i-th line break in this chunk
+      nl=np.flatnonzero(np.frombuffer(chunk,dtype=np.uint8)==ord('\n'))
+      first=(-(nlines+1))%step
+      offsets.append(pos+nl[first::step].astype(np.int64)+1)
+      nlines+=len(nl)
+      pos+=len(chunk)
+      last=chunk[-1:]
+  #last line without line break
+  if last!=b'\n':
+    nlines+=1
+  offsets=np.concatenate(offsets)
+  #drop the offset pointing to the end of the file
+  return nlines,offsets[offsets<pos] if pos>0 else offsets[:0]
+
+#saves the index: a header line with the size and modification time of filename, the step and the
+#number of lines, followed by one offset per line (plain text, so that shell scripts can read it)
+def save(filename,nlines,offsets,step=INDEX_STEP):
+  s=os.stat(filename)
+  idxfile=index_filename(filename)
+  tmp=f"{idxfile}.{os.getpid()}.tmp"
+  with open(tmp,'w') as f:
+    f.write(f"# {s.st_size} {s.st_mtime_ns} {step} {nlines}\n")
+    np.savetxt(f,offsets,fmt='%d')
+  os.replace(tmp,idxfile)
+
+#returns the number of lines and the offsets saved in the index of filename, or None if the index
+#is missing, outdated or was built with a different step
+def read(filename,step=INDEX_STEP):
+  s=os.stat(filename)
+  try:
+    with open(index_filename(filename),'r') as f:
+      header=f.readline().split()
+      if header[1:4]!=[str(s.st_size),str(s.st_mtime_ns),str(step)]:
+        return None
+      offsets=np.loadtxt(f,dtype=np.int64,ndmin=1)
+  except (OSError,ValueError,IndexError):
+    return None
+  return int(header[4]),offsets
+
+#returns the number of lines and the offsets of filename, (re)building and saving the index if needed
+def load(filename,step=INDEX_STEP):
+  out=read(filename,step)
+  if out is None:
+    out=build(filename,step)
+    try:
+      save(filename,*out,step)
+    except OSError:
+      #read-only directory, the index is not kept
+      pass
+  return out
+
+#returns the byte offset of the closest indexed line at or before line start (0-based) of
+#filename and the number of lines that still need to be skipped from there
+def seek(filename,start,step=INDEX_STEP):
+  if start<=0:
+    return 0,0
+  nlines,offsets=load(filename,step)
+  if start>=nlines:
+    return os.path.getsize(filename),0
+  i=min(start//step,len(offsets)-1)
+  return int(offsets[i]),start-i*step
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(\
+    description='shows the byte offset of the closest indexed line at or before line START of FILE '\
+    'and the number of lines that still need to be skipped from there, building the index if needed')
+  parser.add_argument('file', type=str,
+    help='indexed file')
+  parser.add_argument('start', type=int,
+    help='line number (0-based)')
+  parser.add_argument('--step', nargs=1, type=int, required=False, default=[INDEX_STEP], \
+    help='one offset is saved for every this many lines')
+  parsed = parser.parse_args()
+  print(*seek(parsed.file,parsed.start,parsed.step[0]))
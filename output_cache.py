@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+#####################
+# output_cache.py
+#   Records how each plot was made (the contents of the input files, the options and the version of the
+#   scripts) so that a plot is only made again when any of those changed, instead of whenever the plot
+#   file is missing (or always, with --force)
+#####################
+
+import os
+import json
+import hashlib
+
+#size of the chunks read when hashing files
+CHUNK_SIZE=2**24
+
+#returns the sha1 of the contents of filename
+def file_hash(filename):
+  h=hashlib.sha1()
+  with open(filename,'rb') as f:
+    while True:
+      chunk=f.read(CHUNK_SIZE)
+      if not chunk:
+        break
+      h.update(chunk)
+  return h.hexdigest()
+
+#returns the sha1 of the contents of all filenames (e.g. the source files of the scripts making the plot)
+def version(filenames):
+  h=hashlib.sha1()
+  for f in filenames:
+    with open(f,'rb') as fid:
+      h.update(fid.read())
+  return h.hexdigest()
+
+#filename of the record of plotfilename (next to the data cache entries, see column_cache.py)
+def record_filename(cache_dir,plotfilename):
+  return os.path.join(cache_dir,hashlib.sha1(os.path.abspath(plotfilename).encode()).hexdigest()+'.plot.json')
+
+#returns the saved record of plotfilename, or None if there is none
+def load(cache_dir,plotfilename):
+  try:
+    with open(record_filename(cache_dir,plotfilename),'r') as f:
+      return json.load(f)
+  except (OSError,ValueError):
+    return None
+
+#returns the size and modification time of the input files, or None if any of them is not a regular
+#file (pipes and the like cannot be checked for changes)
+def input_stats(files):
+  out=[]
+  for f in files:
+    if not os.path.isfile(f):
+      return None
+    s=os.stat(f)
+    out.append({'file': os.path.abspath(f), 'size': s.st_size, 'mtime_ns': s.st_mtime_ns})
+  return out
+
+#returns None if plotfilename is up to date (was made from the same inputs, options and version) or the
+#reason why it has to be made again; inputs whose size or mtime changed are hashed, so that files that
+#were re-generated with the same contents do not trigger re-plotting
+def check(cache_dir,plotfilename,files,options,script_version):
+  if not os.path.isfile(plotfilename):
+    return 'is missing'
+  stats=input_stats(files)
+  if stats is None:
+    return 'is made from pipes or other non-regular files'
+  record=load(cache_dir,plotfilename)
+  if record is None:
+    return 'has no record of how it was made'
+  if record['version']!=script_version:
+    return 'was made by another version of plot-files'
+  if record['options']!=options:
+    return 'was made with other options'
+  if [i['file'] for i in record['inputs']]!=[s['file'] for s in stats]:
+    return 'was made from other files'
+  touched=False
+  for i,s in zip(record['inputs'],stats):
+    if i['size']==s['size'] and i['mtime_ns']==s['mtime_ns']:
+      continue
+    if i['size']!=s['size'] or file_hash(s['file'])!=i['sha1']:
+      return f"is older than {s['file']}"
+    i['mtime_ns']=s['mtime_ns']
+    touched=True
+  #some inputs were touched but not changed, no need to hash them again next time
+  if touched:
+    write(cache_dir,plotfilename,record)
+  return None
+
+#saves the record of plotfilename
+def write(cache_dir,plotfilename,record):
+  filename=record_filename(cache_dir,plotfilename)
+  try:
+    os.makedirs(cache_dir,exist_ok=True)
+    tmp=f"{filename}.{os.getpid()}.tmp"
+    with open(tmp,'w') as f:
+      json.dump(record,f,indent=1)
+    os.replace(tmp,filename)
+  except OSError as e:
+    print(f"WARNING: could not save the record of {plotfilename}: {e}")
+
+#saves the record of plotfilename, made from files with options and script_version; stats are those of
+#files before they were read (nothing is saved if they changed in the meantime, since the plot may have
+#old data); the hashes of the previous record are reused for the inputs that did not change since then
+def save(cache_dir,plotfilename,files,options,script_version,stats=None):
+  if stats is None:
+    stats=input_stats(files)
+  if stats is None:
+    return
+  previous=load(cache_dir,plotfilename)
+  hashes={}
+  if previous is not None:
+    hashes={(i['file'],i['size'],i['mtime_ns']):i['sha1'] for i in previous['inputs']}
+  inputs=[]
+  for s in stats:
+    sha1=hashes.get((s['file'],s['size'],s['mtime_ns'])) or file_hash(s['file'])
+    inputs.append(dict(s,sha1=sha1))
+  if input_stats(files)!=stats:
+    return
+  write(cache_dir,plotfilename,{
+    'plot': os.path.abspath(plotfilename),
+    'version': script_version,
+    'options': options,
+    'inputs': inputs,
+  })
+
+#removes all records
+def clear(cache_dir):
+  if not os.path.isdir(cache_dir):
+    return
+  for f in os.listdir(cache_dir):
+    if f.endswith('.plot.json'):
+      os.remove(os.path.join(cache_dir,f))
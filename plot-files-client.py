@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+
+#####################
+# plot-files-client.py
+#   Makes a plot with the daemon started with 'plot-files.py --serve' (accepts the same arguments as
+#   plot-files.py, plus --socket if the daemon is not listening on the default socket); if there is no
+#   daemon, the plot is made by plot-files.py in this process
+#####################
+
+import os
+import sys
+import runpy
+import argparse
+import render_server as rs
+
+if __name__ == '__main__':
+  #--socket (also given as --socket=PATH) is for this script, all other arguments go to the daemon
+  parser=argparse.ArgumentParser(add_help=False,allow_abbrev=False)
+  parser.add_argument('--socket', nargs=1, type=str, required=False, default=[None])
+  parsed,argv=parser.parse_known_args()
+  out=rs.request(parsed.socket[0],argv)
+  if out is None:
+    #no daemon, the plot is made here
+    script=os.path.join(os.path.dirname(os.path.abspath(__file__)),'plot-files.py')
+    sys.argv=[script]+argv
+    runpy.run_path(script,run_name='__main__')
+  else:
+    status,output=out
+    print(output,end='')
+    sys.exit(status)
@@ -14,27 +14,38 @@ for d in [\
     sys.path.insert(1,d)
 
 import time
-import collections
+import concurrent.futures
 import argparse
-import math
-import time_conversion as tc
+import column_reader as cr
+import column_cache as cc
+import date_parsing as dp
+import decimation as dc
+import alignment as al
+import plotly_lod as lod
+import batch
+import render_server as rs
+import output_cache as oc
+import profiling as pf
 import numpy as np
-import matplotlib as mpl
 import faulthandler; faulthandler.enable()
-mpl.use('Agg')
-import matplotlib.pyplot as plt
-from operator import sub
-from scipy.interpolate import interp1d
-from scipy import signal
-from datetime import datetime
-from matplotlib.ticker import FormatStrFormatter
-from matplotlib.ticker import LogFormatterMathtext
-import re
-import plotly.express as px
-from htmlcreator import HTMLDocument
-import pandas as pd
-
-mpl.rcParams['agg.path.chunksize'] = 10000
+#NOTICE: matplotlib, pandas, scipy, plotly and htmlcreator are slow to import, so they are only imported
+#        when (and if) the plot needs them; this way e.g. --out-name and skipped plots are fast
+
+#imports matplotlib.pyplot, set up for plotting into files
+def pyplot():
+  import matplotlib as mpl
+  mpl.use('Agg')
+  mpl.rcParams['agg.path.chunksize'] = 10000
+  import matplotlib.pyplot as plt
+  return plt
+
+#imports all plotting modules at once (e.g. so that a --serve daemon is fast from the first plot)
+def preload():
+  pyplot()
+  import pandas
+  import scipy.signal
+  import plotly.graph_objects
+  import htmlcreator
 
 def clean_cal(i):
   return i.replace(':','').replace('/','').replace(' ','T')
@@ -47,13 +58,6 @@ def split_results(results,typ):
     y.append(data.get(typ))
   return x,y
 
-def gauss_window(width,dx):
-  x=np.linspace(-width/dx/2, width/dx/2, int(width/dx+1))
-  sigma=width/dx/3
-  y=1/np.sqrt(2*np.pi*sigma**2) * np.exp(-(x**2)/(2*sigma**2))
-  y=y/np.sum(y)
-  return y
-
 # https://stackoverflow.com/questions/11686720/is-there-a-numpy-builtin-to-reject-outliers-from-a-list
 def reject_outliers(x, m = 2.):
   d = np.abs(x - np.median(x))
@@ -69,39 +73,51 @@ def xstep(x,max_iter=10):
     dx=reject_outliers(dx)
   return np.median(dx)
 
-#converts x,y data into a pandas series
-def series_wrapper(x,y,isabs,smooth_w,isasd,asd_method,asd_window_name,asd_window_width):
+#smooths y with a Gaussian window with 3-sigma width smooth_w (same units as x), if positive (see smoothing.py);
+#dx is the typical step of x, computed if not given
+def smooth(x,y,smooth_w,dx=None):
   if smooth_w>0:
-    dx=xstep(x)
-    w=gauss_window(smooth_w,dx)
+    import smoothing as sm
+    if dx is None:
+      dx=xstep(x)
     if parsed.debug:
       print(f"dx         : {dx}")
       print(f"gauss width: {smooth_w}")
-      # print(f"gauss coeff: {w}")
-    y=np.convolve(y,w,'same')
-  if isasd:
-    dx=1/xstep(x)
-    if asd_method=='periodogram':
-      x,y = signal.periodogram(y,dx,asd_window_name,detrend='linear',scaling='density',return_onesided=True)
-    if asd_method=='welch':
-      x,y = signal.welch(      y,dx,asd_window_name,detrend='linear',scaling='density',return_onesided=True,nperseg=int(asd_window_width*len(x)))
-    if asd_method=='lombscargle':
-      f = np.logspace(math.log10(1/2/(x[-1]-x[1])/2/np.pi),math.log10(1/2/dx/2/np.pi),len(x))
-      y = signal.lombscargle(x,y,f)
-      x = f*2*np.pi
-    y=np.sqrt(y)
-  elif isabs:
-    y=np.abs(y)
-  out=pd.Series(y,index=x)
+      print(f"gauss meth : {sm.pick_method(smooth_w/dx,parsed.gauss_method[0])}")
+    with profile.stage('smooth',len(y)):
+      y=sm.smooth(x,y,smooth_w,dx,parsed.gauss_method[0],parsed.gauss_max_gap[0],parsed.gauss_irregular)
+  return y
+
+#converts x,y data into a pandas series (without copying them), without repeated x
+def to_series(x,y):
+  import pandas as pd
+  out=pd.Series(y,index=x,copy=False)
   if not out.index.is_unique:
     out=out[~out.index.duplicated(keep='first')]
   return out
 
-#computes the mean of y, subtracts it from y, appends it as string to dataname
+#converts x,y data into a pandas series
+def series_wrapper(x,y,isabs,smooth_w,isasd,asd_method,asd_window_name,asd_window_width,asd_oversampling,asd_nfreq,asd_segment):
+  y=smooth(x,y,smooth_w)
+  if isasd:
+    import spectra as sp
+    with profile.stage('asd',len(y)):
+      x,y=sp.asd(x,np.asarray(y)[:,None],1/xstep(x),asd_method,asd_window_name,asd_window_width,asd_oversampling,asd_nfreq,asd_segment)
+    y=y[:,0]
+  elif isabs:
+    y=np.abs(y)
+  return to_series(x,y)
+
+#computes the mean of y, subtracts it from y, appends it as string to dataname; y is changed in place if it
+#is not a view of other data (e.g. of the data cache, which is read-only and reused by other plots)
 def handle_mean(y,dataname,mean,demean):
   if demean:
-    mean.append(np.mean(y))
-    y=[yi-mean[-1] for yi in y]
+    with profile.stage('demean',len(y)):
+      mean.append(np.mean(y,dtype=np.float64))
+      if y.flags.owndata and y.flags.writeable:
+        y-=y.dtype.type(mean[-1])
+      else:
+        y=y-y.dtype.type(mean[-1])
     dataname=f"{dataname} {mean[-1]:9.3g}"
   else:
     mean.append(0)
@@ -109,7 +125,109 @@ def handle_mean(y,dataname,mean,demean):
     print(f"mean={mean[-1]}")
   return y,dataname,mean
 
-if __name__ == '__main__':
+#the best location of the legend is searched among all points drawn, which is slow for more than this many
+#points (the legend goes to the upper right corner then)
+LEGEND_BEST_MAX=10**6
+
+#options that do not change the plot, ignored when checking if a plot is up to date (see output_cache.py);
+#the input files and the plot filename are checked separately
+NOT_PLOT_OPTIONS=['files','out','debug','force','timing','profile','profile_memory','cprofile','get_supported_filetypes','out_name','batch','jobs',
+  'serve','socket','watch','watch_interval','memory_cache_size','cache_dir','cache_size','no_cache','clear_cache','no_output_cache']
+
+#version of the scripts making the plots, computed once (see output_cache.py)
+script_version=None
+def get_script_version():
+  global script_version
+  if script_version is None:
+    here=os.path.dirname(os.path.abspath(__file__))
+    htmlcreator=os.path.join(here,'htmlcreator')
+    #spectra and smoothing import scipy, which is slow, so they are not imported here
+    script_version=oc.version([os.path.abspath(__file__)]+[m.__file__ for m in (cr,dp,dc,al,lod)]+
+      [os.path.join(here,f) for f in ('spectra.py','smoothing.py')]+
+      sorted(os.path.join(htmlcreator,f) for f in os.listdir(htmlcreator) if f.endswith('.py')))
+  return script_version
+
+#reads the columns of file fn (see column_reader.read_window), from the data cache if possible, with the
+#data columns as dtype
+def read_file(fn,tcol,dcols,x_date_format,window,start,nlines,cache_dir,cache_size,no_cache,dtype):
+  if no_cache or start>0 or nlines is not None:
+    return cr.read_window(fn,tcol,dcols,x_date_format,*window,start=start,nlines=nlines,dtype=dtype)
+  return cc.read_window(fn,tcol,dcols,x_date_format,*window,cache_dir,cache_size,dtype)
+
+#same as read_file, meant to run in a worker process: data that is saved in the data cache is not sent back,
+#since it is faster to memory-map it from the cache afterwards (None is returned instead)
+def cache_file(fn,tcol,dcols,x_date_format,window,start,nlines,cache_dir,cache_size,no_cache,dtype):
+  if no_cache or start>0 or nlines is not None:
+    return read_file(fn,tcol,dcols,x_date_format,window,start,nlines,cache_dir,cache_size,no_cache,dtype)
+  t,y,cached=cc.read_window_cached(fn,tcol,dcols,x_date_format,*window,cache_dir,cache_size,dtype)
+  return None if cached else (t,y)
+
+#reads the files (see read_file) at the same time, with njobs processes; returns the list of data read from
+#each file in the same order, with the data from memory_cache if available
+def read_files(files,njobs,*args):
+  keys=[memory_cache.key(fn,*args) for fn in files]
+  data=[memory_cache.get(k) for k in keys]
+  #pipes and the like are read in this process
+  todo=[i for i,d in enumerate(data) if d is None and os.path.isfile(files[i])]
+  if njobs>1 and len(todo)>1:
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(njobs,len(todo))) as pool:
+      for i,out in zip(todo,pool.map(cache_file,[files[i] for i in todo],*[[a]*len(todo) for a in args])):
+        data[i]=out
+  for i,fn in enumerate(files):
+    if data[i] is None:
+      data[i]=read_file(fn,*args)
+    memory_cache.put(keys[i],data[i])
+  return data
+
+#yields the columns of file fn block by block (see read_file), so that they need not fit in memory: cached
+#data is memory-mapped and sliced, anything else is parsed as it is read
+def read_chunks(fn,tcol,dcols,x_date_format,window,start,nlines,cache_dir,cache_size,no_cache,dtype):
+  if no_cache or start>0 or nlines is not None or not os.path.isfile(fn):
+    blocks=cr.read_blocks(fn,tcol,dcols,x_date_format,start=start,nlines=nlines)
+  else:
+    tm,dm=cc.read_window(fn,tcol,dcols,x_date_format,None,None,cache_dir,cache_size)
+    n=max(1,cr.BLOCK_SIZE//(8*(len(dcols)+1)))
+    blocks=((tm[i:i+n],dm[i:i+n]) for i in range(0,len(tm),n))
+  for t,d in blocks:
+    idx=cr.window_index(t,*window)
+    if not idx.all():
+      t,d=t[idx],d[idx]
+    yield t,d.astype(dtype,copy=False)
+
+#welch spectra of the cols-columns of file fn, computed while reading it (see read_chunks, which gets the
+#remaining arguments) with segments of the given length (see spectra.segment_length); the sampling
+#frequency is that of the first block; returns the same as spectra.asd
+def stream_asd(fn,cols,window_name,segment,*args):
+  import spectra as sp
+  welch=None
+  pending=[]
+  for t,d in read_chunks(fn,*args):
+    if welch is None:
+      #the sampling frequency needs at least two points
+      pending.append((t,d))
+      t=np.concatenate([i[0] for i in pending])
+      if len(t)<2:
+        continue
+      fs=1/xstep(t)
+      welch=sp.Welch(fs,sp.segment_length(segment,fs),window_name)
+      d=np.concatenate([i[1] for i in pending])
+      pending=None
+    welch.add(d[:,cols])
+  if welch is None:
+    raise ValueError(f"not enough data in {fn} to compute its spectrum")
+  f,p=welch.psd()
+  return f,np.sqrt(p)
+
+#in-memory cache of the data parsed from the files, reused by all plots made in this process (see --batch)
+memory_cache=cc.MemoryCache()
+
+#stages of the plot being made (see --profile), nothing is recorded unless requested
+profile=pf.Profile()
+
+#makes one plot, as defined by the command line arguments in argv (defaults to sys.argv); main calls itself
+#again, with profiled set, to be profiled as requested by --profile and --cprofile
+def main(argv=None,profiled=False):
+  global parsed,profile
   # argument parsing
   parser = argparse.ArgumentParser(\
     epilog="")
@@ -123,9 +241,10 @@ if __name__ == '__main__':
   parser.add_argument('-F','--filelabels', action='append', type=str, required=False, default='',\
     help='labels the FILES in the legend entries, defaults to the basename of FILES')
   parser.add_argument('-S','--start', nargs=1, type=int, required=False, default=[0], \
-    help='plot only from this line onwards (not yet implemented)')
-  parser.add_argument('-L','--len', nargs=1, type=int, required=False, default=[999999999999999], \
-    help='plot only this number of lines (not yet implemented)')
+    help='plot only from this line onwards (0-based, counting all lines in FILES, including comments); '\
+    'a sparse index of the line offsets is saved next to FILES so that this is fast for large files')
+  parser.add_argument('-L','--len', nargs=1, type=int, required=False, default=[None], \
+    help='plot only this number of lines, defaults to all lines')
   parser.add_argument('-o','--out', nargs=1, type=str, required=False,\
     help='filename of the resulting plot, defaults to FILES[.gGAUSS][.diff][.log][.asd].png; '\
     '"interactive" only shows the plot')
@@ -133,6 +252,12 @@ if __name__ == '__main__':
     help='show debug info')
   parser.add_argument('-d','--diff', required=False, action='store_true', \
     help='plot the difference between the first two time series (all remaining time series are discarded)')
+  parser.add_argument('--diff-ref', nargs=1, type=int, required=False, default=[None], \
+    help='plot the differences between all time series and this one (0 is the first time series, std columns are not counted), '\
+    'instead of the time series themselves')
+  parser.add_argument('--diff-tol', nargs=1, type=float, required=False, default=[0], \
+    help='with --diff or --diff-ref, x values closer than this are subtracted (same x-units as the t-column, in seconds with '\
+    '--x-date-format), by default only equal x values are')
   parser.add_argument('-H','--height', nargs=1, type=float, required=False, default=[6], \
     help='figure height in inches')
   parser.add_argument('-W','--width', nargs=1, type=float, required=False, default=[18], \
@@ -145,20 +270,41 @@ if __name__ == '__main__':
     help='add this string as plot title')
   parser.add_argument('-g','--gauss', nargs=1, type=float, required=False, default=[0], \
     help='3-sigma width of the Gaussian smoothing window (same x-units as the t-column)')
+  parser.add_argument('--gauss-method', nargs=1, type=str, required=False, default=['auto'], choices=['auto','direct','fft','box'], \
+    help='how to smooth with --gauss: direct convolution, FFT convolution or a cascade of moving averages approximating the '\
+    'Gaussian (fastest for very wide windows); auto picks one depending on the number of points in the window')
+  parser.add_argument('--gauss-max-gap', nargs=1, type=float, required=False, default=[None], \
+    help='the data on either side of spacings larger than this (same x-units as the t-column) is smoothed separately, '\
+    'defaults to 1.5 times the typical spacing')
+  parser.add_argument('--gauss-irregular', required=False, action='store_true', \
+    help='smooth with weighted averages as function of the t-column, instead of assuming the data is evenly spaced '\
+    '(e.g. for irregularly sampled data)')
   parser.add_argument('-p','--asd', required=False, action='store_true', \
     help='plot one-sided amplitude spectrum density [units/sqrt(Hz)] with one of the methods defined in --asd-method (the data is detrended beforehand)')
   parser.add_argument('--asd-method', nargs=1, type=str, required=False, default=['welch'],choices=['periodogram','welch','lombscargle'], \
-    help='method to compute the amplitude spectrum density')
+    help='method to compute the amplitude spectrum density (lombscargle handles gaps and uneven sampling)')
   parser.add_argument('--asd-window-name', nargs=1, type=str, required=False, default=['hann'], \
     help='window name, as defined in scipy.signal.get_window (irrelevant to lombscargle)')
   parser.add_argument('--asd-window-width', nargs=1, type=float, required=False, default=[0.1], \
     help='window width, as fraction of complete data period (only relevant to welch)')
-  parser.add_argument('-s','--start-x', nargs=1, type=float, required=False, default=[-999999999999999.0], \
-    help='initial x value (same x-units as the t-column)')
-  parser.add_argument('-e','--end-x', nargs=1, type=float, required=False, default=[999999999999999.0], \
-    help='final x value (same x-units as the t-column)')
+  parser.add_argument('--asd-segment', nargs=1, type=str, required=False, default=[None], \
+    help='length of the welch segments, in samples (e.g. 4096) or in seconds with an "s" suffix (e.g. 600s, same units as the t-column), '\
+    'instead of --asd-window-width; the spectra are then computed while FILES are read, so that the data does not have to fit '\
+    'in memory (unless it is needed for --gauss, --diff, --diff-ref or std columns)')
+  parser.add_argument('--asd-oversampling', nargs=1, type=float, required=False, default=[4], \
+    help='the frequencies are spaced by the inverse of the complete data period divided by this number (only relevant to lombscargle)')
+  parser.add_argument('--asd-nfreq', nargs=1, type=int, required=False, default=[None], \
+    help='number of frequencies, defaults to as many as needed to reach the Nyquist frequency of the average sampling '\
+    '(only relevant to lombscargle, which is computed in O(N log N) operations with the algorithm of Press and Rybicki, 1989)')
+  parser.add_argument('-s','--start-x', nargs=1, type=str, required=False, default=[None], \
+    help='initial x value (same x-units as the t-column or, with --x-date-format, a date in that format or in ISO 8601)')
+  parser.add_argument('-e','--end-x', nargs=1, type=str, required=False, default=[None], \
+    help='final x value (same x-units as the t-column or, with --x-date-format, a date in that format or in ISO 8601); '\
+    'files with sorted x are only read up to here, unless they are already in the data cache (files read this way are '\
+    'not cached, plot them once without --end-x to cache them)')
   parser.add_argument('-w','--widen', nargs=1, type=float, required=False, default=[0], \
-    help='add these many units of x-data to the start and end of the plot (only relevant when -s and/or -e are present)')
+    help='add these many units of x-data to the start and end of the plot (only relevant when -s and/or -e are present; '\
+    'in seconds with --x-date-format)')
   parser.add_argument('-q','--x-date-format', nargs=1, type=str, required=False, default='none', \
     help='considers the "t" column as dates (uses matplotlib.pyplot.plot_date instead of matplotlib.pyplot.plot)')
   parser.add_argument('-z','--font-size', nargs=1, type=int, required=False, default=[12], \
@@ -170,31 +316,117 @@ if __name__ == '__main__':
   parser.add_argument('-G','--grid', required=False, action='store_true', \
     help='turn on the major tick grid')
   parser.add_argument('-K','--force', required=False, action='store_true', \
-    help='force replotting even if plot file is already available')
+    help='force replotting even if plot file is already available and up to date')
   parser.add_argument('-t','--timing', required=False, action='store_true', \
     help='show timing information')
+  parser.add_argument('--profile', nargs=1, type=str, required=False, default=[None], \
+    help='append a json line to this file (- for stderr) with the time spent in each stage of the plot (and the rows processed there), '\
+    'the peak memory use and the size of the plot file, so that many runs can be aggregated')
+  parser.add_argument('--profile-memory', required=False, action='store_true', \
+    help='with --profile, also trace the peak memory allocated by python and numpy (slower), besides the peak resident set size')
+  parser.add_argument('--cprofile', nargs=1, type=str, required=False, default=[None], \
+    help='save the cProfile statistics of the plot to this file (see the pstats module)')
   parser.add_argument('--get-supported-filetypes', required=False, action='store_true', \
     help='show supported file types and exit')
+  parser.add_argument('--rasterize-above', nargs=1, type=int, required=False, default=[20000], \
+    help='in vector file types (pdf, svg, eps, ...), draw the series (and std bands) with more points than this '\
+    '(after --decimate) as images, keeping axes, labels and legend as vectors, so that the files are small and fast to open')
+  parser.add_argument('--raster-dpi', nargs=1, type=float, required=False, default=[300], \
+    help='resolution of the series drawn as images in vector file types (see --rasterize-above)')
   parser.add_argument('--html', required=False, action='store_true', \
     help='plot the data as an interactive html file, using plotly (https://plotly.com/graphing-libraries/)')
   parser.add_argument('--demean', required=False, action='store_true', \
     help='remove the mean from each time series before plotting and show the mean value in the legend entry')
   parser.add_argument('--out-name', required=False, action='store_true', \
     help='show the automatic name of the resulting plot and exit (nothing is plotted)')
+  parser.add_argument('--batch', nargs=1, type=str, required=False, \
+    help='make all plots defined in this manifest file (FILES and LABELS are then not required): '\
+    'json or yaml with a list of jobs, each with a list of arguments or a single string, '\
+    'or plain text with the arguments of one job per line (quoted as in a shell); any other arguments given here are appended to all jobs')
+  parser.add_argument('--jobs', nargs=1, type=int, required=False, default=[None], \
+    help='number of processes reading FILES at the same time, defaults to the number of FILES (up to the number of cores); '\
+    'with --batch, number of processes making plots at the same time (jobs plotting the same files go to the same process), defaults to 1')
+  parser.add_argument('--serve', required=False, action='store_true', \
+    help='keep running and make the plots requested with plot-files-client.py (which accepts the same arguments as this script), '\
+    'so that modules are imported only once and recently plotted data is kept in memory')
+  parser.add_argument('--socket', nargs=1, type=str, required=False, default=[rs.default_socket()], \
+    help='Unix domain socket where --serve listens for requests')
+  parser.add_argument('--watch', required=False, action='store_true', \
+    help='keep running and make the plot again whenever FILES change (e.g. when data is appended to them); '\
+    'only the data appended since the previous plot is parsed')
+  parser.add_argument('--watch-interval', nargs=1, type=float, required=False, default=[5.0], \
+    help='with --watch, seconds between checks of FILES (also the minimum time between plots)')
+  parser.add_argument('--dtype', nargs=1, type=str, required=False, default=['float64'], choices=['float32','float64'], \
+    help='precision of the data columns in memory (the t-column is always float64 or, with --x-date-format, dates); '\
+    'float32 takes half the memory, which is useful for large files')
+  parser.add_argument('--memory-cache-size', nargs=1, type=float, required=False, default=[cc.DEFAULT_MEMORY_CACHE_SIZE], \
+    help='maximum size in MB of the data kept in memory to be reused by the following plots of --batch')
+  parser.add_argument('--cache-dir', nargs=1, type=str, required=False, default=[cc.default_cache_dir()], \
+    help='directory where the parsed data of FILES is cached, to speed up re-plotting the same files')
+  parser.add_argument('--cache-size', nargs=1, type=float, required=False, default=[cc.DEFAULT_CACHE_SIZE], \
+    help='maximum size of the data cache in MB, the least recently used entries are removed first')
+  parser.add_argument('--no-cache', required=False, action='store_true', \
+    help='do not use the data cache (FILES are always parsed)')
+  parser.add_argument('--clear-cache', required=False, action='store_true', \
+    help='remove all entries of the data cache (and all records of how plots were made) and exit')
+  parser.add_argument('--no-output-cache', required=False, action='store_true', \
+    help='skip plotting whenever the plot file is already available; by default, a record of how each plot was made '\
+    '(contents of FILES, options and version of this script) is kept in the cache directory and the plot is made again '\
+    'if any of those changed')
+  parser.add_argument('--decimate', nargs=1, type=str, required=False, default=['minmax'], choices=dc.METHODS, \
+    help='reduce the number of points plotted to a few per horizontal pixel of the figure (see --width), '\
+    'keeping the minimum and maximum in each pixel (minmax), the most prominent points (lttb, Largest-Triangle-Three-Buckets) '\
+    'or all points (none)')
+  parser.add_argument('--no-html-lod', required=False, action='store_true', \
+    help='do not embed the finer levels of detail of the data in --html plots (by default, zooming in shows all the data, '\
+    'with the finest level that makes sense for the visible x-range, instead of the data decimated for the complete plot)')
+  parser.add_argument('--html-dtype', nargs=1, type=str, required=False, default=['float64'], choices=list(lod.DTYPES), \
+    help='precision of the y values embedded in --html plots (as base64 typed arrays, float32 takes half the space)')
+  parser.add_argument('--html-delta-x', required=False, action='store_true', \
+    help='embed the differences between consecutive x values of the levels of detail in --html plots, with the precision '\
+    'of --html-dtype (e.g. dates keep their precision as float32, which they would not otherwise); the x values of the '\
+    'plotted traces are embedded as they are, so this does nothing with --no-html-lod')
+  parser.add_argument('--html-prettify', required=False, action='store_true', \
+    help='indent the html file so that it is easier to read (slow for plots with many points)')
 
 
   #TODO: fix this
   # parser.add_argument('-n','--y-tick-fmt', nargs=1, type=str, required=False, default='{:.2f}', \
   #   help='format of the tick labels for the y-axis')
 
-  parsed = parser.parse_args()
+  parsed = parser.parse_args(argv)
+
+  #make the plot again, within the profilers
+  if not profiled and (parsed.profile[0] is not None or parsed.cprofile[0] is not None):
+    profile=pf.Profile(parsed.profile[0] is not None,parsed.profile_memory)
+    profile.info['argv']=sys.argv[1:] if argv is None else list(argv)
+    result='error'
+    try:
+      with profile:
+        if parsed.cprofile[0] is None:
+          result=main(argv,True)
+        else:
+          import cProfile
+          cprofile=cProfile.Profile()
+          try:
+            result=cprofile.runcall(main,argv,True)
+          finally:
+            cprofile.dump_stats(parsed.cprofile[0])
+    finally:
+      profile.info['result']=result
+      if parsed.profile[0] is not None:
+        profile.write(parsed.profile[0])
+      profile=pf.Profile()
+    return result
 
   #setup timing infrastructure
   if parsed.timing:
     start_time=time.time()
   def show_timing(str):
     if parsed.timing:
-      print("Timinig : {str} : {sec} seconds".format(str=str,sec=(time.time() - start_time)))
+      print("Timing : {str} : {sec} seconds".format(str=str,sec=(time.time() - start_time)))
+
+  memory_cache.max_size=parsed.memory_cache_size[0]
 
   #handle incompatible arguments
   demean=parsed.demean
@@ -204,12 +436,20 @@ if __name__ == '__main__':
 
   #NOTICE: this is here to make it possible to see which file types are supported in this system;
   if parsed.get_supported_filetypes:
-    print(list(plt.gcf().canvas.get_supported_filetypes().keys()))
+    print(list(pyplot().gcf().canvas.get_supported_filetypes().keys()))
     show_timing('retrieved supported file types')
-    sys.exit()
+    return
+  #clear cache if requested
+  if parsed.clear_cache:
+    cc.clear(parsed.cache_dir[0])
+    oc.clear(parsed.cache_dir[0])
+    show_timing('cleared cache')
+    return
   #NOTICE: run this script with '--get-supported-filetypes -t -f 1 -b 1' to what what file types are supported and change this variable as needed
   #NOTICE: plt.gcf().canvas.get_supported_filetypes().keys() is not evaluated every time this script is run because it is very slow in some systems
   get_supported_filetypes=['eps', 'jpg', 'jpeg', 'pdf', 'pgf', 'png', 'ps', 'raw', 'rgba', 'svg', 'svgz', 'tif', 'tiff']
+  #file types where lines are saved as vectors (every point is written to the file)
+  vector_filetypes=['eps', 'pdf', 'pgf', 'ps', 'svg', 'svgz']
 
   #build plot filename
   try:
@@ -219,7 +459,10 @@ if __name__ == '__main__':
     for f in parsed.files:
       plotfilename+=os.path.basename(f)+'.'
     if parsed.gauss[0]>0: plotfilename+=f"g{str(int(parsed.gauss[0]))}."
-    if parsed.diff:       plotfilename+='diff.'
+    if parsed.diff_ref[0] is not None:
+      plotfilename+=f"diff{parsed.diff_ref[0]}."
+    elif parsed.diff:
+      plotfilename+='diff.'
     if parsed.logx:       plotfilename+='logx.'
     if parsed.logy:       plotfilename+='logy.'
     if demean:            plotfilename+='demean.'
@@ -227,7 +470,9 @@ if __name__ == '__main__':
       plotfilename+=f"{parsed.asd_method[0]}."
       if not parsed.asd_method[0]=="lombscargle":
         plotfilename+=f"{parsed.asd_window_name[0]}."
-        if parsed.asd_method[0]=="welch":
+        if parsed.asd_method[0]=="welch" and parsed.asd_segment[0] is not None:
+          plotfilename+=f"{parsed.asd_segment[0]}."
+        elif parsed.asd_method[0]=="welch":
           plotfilename+=f"{parsed.asd_window_width[0]}."
   #handle extension
   extension=os.path.splitext(plotfilename)[-1]
@@ -245,14 +490,39 @@ if __name__ == '__main__':
   #maybe only show the filename
   if parsed.out_name:
     print(plotfilename)
-    exit()
+    return
+  profile.info['plot']=plotfilename
   #avoid re-plotting
-  if os.path.isfile(plotfilename) and not parsed.force:
-    print("plot "+plotfilename+" already available, skipping...")
-    sys.exit()
+  if parsed.no_output_cache or plotfilename=='interactive':
+    if os.path.isfile(plotfilename) and not parsed.force:
+      print("plot "+plotfilename+" already available, skipping...")
+      return 'hit'
+  else:
+    plot_options={k:v for k,v in vars(parsed).items() if not k in NOT_PLOT_OPTIONS}
+    #size and mtime of the files before reading them
+    input_stats=oc.input_stats(parsed.files)
+    if not parsed.force:
+      with profile.stage('check'):
+        reason=oc.check(parsed.cache_dir[0],plotfilename,parsed.files,plot_options,get_script_version())
+      if reason is None:
+        print("plot "+plotfilename+" already available and up to date, skipping...")
+        return 'hit'
+      if parsed.debug or reason!='is missing':
+        print(f"plot {plotfilename} {reason}, plotting...")
   #inform
   show_timing('built plotfilename')
 
+  #only now that there is something to plot
+  with profile.stage('import'):
+    import pandas as pd
+    if parsed.html:
+      import plotly.graph_objects as go
+      import plotly.colors
+      from htmlcreator import HTMLDocument
+    else:
+      plt=pyplot()
+  show_timing('imported plotting modules')
+
   #default file labels
   filelabels=[]
   for f in parsed.files:
@@ -276,7 +546,7 @@ if __name__ == '__main__':
     if not x_label: x_label='Hz'
     else:
       print(x_label)
-      exit()
+      return
   if parsed.y_label:
     y_label=parsed.y_label[0]
   else:
@@ -299,16 +569,24 @@ if __name__ == '__main__':
     print(f"len        : {parsed.len}")
     print(f"out        : {plotfilename}")
     print(f"diff       : {parsed.diff}")
+    print(f"diff-ref   : {parsed.diff_ref[0]}")
+    print(f"diff-tol   : {parsed.diff_tol[0]}")
     print(f"height     : {parsed.height[0]}")
     print(f"width      : {parsed.width[0]}")
     print(f"logy       : {parsed.logy}")
     print(f"logx       : {parsed.logx}")
     print(f"title      : {title}")
     print(f"gauss      : {parsed.gauss}")
+    print(f"gauss meth : {parsed.gauss_method[0]}")
+    print(f"gauss gap  : {parsed.gauss_max_gap[0]}")
+    print(f"gauss irreg: {parsed.gauss_irregular}")
     print(f"asd        : {parsed.asd}")
     print(f"asd method : {parsed.asd_method[0]}")
     print(f"asd w name : {parsed.asd_window_name[0]}")
     print(f"asd w width: {parsed.asd_window_width}")
+    print(f"asd segment: {parsed.asd_segment[0]}")
+    print(f"asd oversam: {parsed.asd_oversampling[0]}")
+    print(f"asd nfreq  : {parsed.asd_nfreq[0]}")
     print(f"start-x    : {parsed.start_x}")
     print(f"stop-x     : {parsed.end_x}")
     print(f"widen      : {parsed.widen}")
@@ -320,6 +598,11 @@ if __name__ == '__main__':
     print(f"timing     : {parsed.timing}")
     print(f"html       : {parsed.html}")
     print(f"demean     : {demean}")
+    print(f"cache-dir  : {parsed.cache_dir[0]}")
+    print(f"cache-size : {parsed.cache_size[0]}")
+    print(f"no-cache   : {parsed.no_cache}")
+    print(f"decimate   : {parsed.decimate[0]}")
+    print(f"no-html-lod: {parsed.no_html_lod}")
     # print(f"y-tick-fmt : {parsed.y_tick_fmt}")
 
   if not parsed.html: plt.rcParams.update({'font.size': parsed.font_size[0]})
@@ -349,22 +632,118 @@ if __name__ == '__main__':
   isdone=False
   rx=[]
   ry=[]
+  #name, mean and whether it is a 'std' column, of each time series in rx,ry
+  rn=[]
+  rm=[]
+  rstd=[]
   ri=0
   ci=0
   clr={}
   plot_data={}
   plot_fill={}
   mean=[]
-  for fi,fn in enumerate(parsed.files):
+  if parsed.x_date_format == 'none':
+    x_date_format=None
+  else:
+    x_date_format=parsed.x_date_format[0]
+  #x-domain limits, applied while reading
+  window=[]
+  for x,w in ((parsed.start_x[0],-parsed.widen[0]),(parsed.end_x[0],parsed.widen[0])):
+    if x is None:
+      window.append(None)
+    elif x_date_format is None:
+      window.append(float(x)+w)
+    else:
+      window.append(dp.parse_date(x,x_date_format)+np.timedelta64(int(w*1e6),'us'))
+  if parsed.debug:
+    print(f"x-window   : {window}")
+  #adds the difference between time series i and j (at the x values matched within --diff-tol) to the plot data
+  def add_diff(i,j,dataname):
+    nonlocal ci,mean
+    #the means are added back, so that this is the difference of the original data
+    with profile.stage('diff') as stage:
+      xc,res=al.difference(rx[i],ry[i]+rm[i],rx[j],ry[j]+rm[j],parsed.diff_tol[0])
+      stage['rows']=len(xc)
+    if parsed.debug:
+      print(f"res[{dataname}]={res[0:3]}...{res[-3:]}")
+    #compute mean if requested
+    if demean:
+      res,dataname,mean=handle_mean(res,dataname,mean,demean)
+      if parsed.debug:
+        print(f"res[{dataname}]={res[0:3]}...{res[-3:]}")
+    #save line color index
+    ci+=1
+    clr[dataname]=f"C{ci}"
+    if parsed.debug:
+      print(f"clr[{dataname}]={clr[dataname]}")
+    #save data
+    plot_data[dataname]=series_wrapper(xc,res,parsed.logy,
+      parsed.gauss[0],parsed.asd,parsed.asd_method[0],
+      parsed.asd_window_name[0],parsed.asd_window_width[0],parsed.asd_oversampling[0],parsed.asd_nfreq[0],parsed.asd_segment[0])
+    if parsed.debug:
+      print(f"rx[{dataname}]={ xc[0:3]}...{ xc[-3:]}")
+      print(f"ry[{dataname}]={res[0:3]}...{res[-3:]}")
+  diff_ref=parsed.diff_ref[0]
+  #with --diff, only the first two time series are needed
+  files=parsed.files
+  if parsed.diff and diff_ref is None:
+    files=files[:1 if len(dcols)>=2 else 2]
+  njobs=parsed.jobs[0]
+  if njobs is None:
+    njobs=min(len(files),os.cpu_count() or 1)
+  read_args=(tcol,dcols,x_date_format,tuple(window),parsed.start[0],parsed.len[0],
+    parsed.cache_dir[0],parsed.cache_size[0],parsed.no_cache,parsed.dtype[0])
+  #with the length of the welch segments, spectra can be computed while reading, if nothing else needs the data
+  asd_data=None
+  if parsed.asd and parsed.asd_method[0]=='welch' and parsed.asd_segment[0] is not None and parsed.gauss[0]<=0 \
+    and not parsed.diff and diff_ref is None and not stdcols:
+    cols=list(range(len(dcols)))
+    args=(cols,parsed.asd_window_name[0],parsed.asd_segment[0])+read_args
+    with profile.stage('read_asd'):
+      if njobs>1 and len(files)>1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(njobs,len(files))) as pool:
+          spectra=list(pool.map(stream_asd,files,*[[a]*len(files) for a in args]))
+      else:
+        spectra=[stream_asd(fn,*args) for fn in files]
+    asd_data={(fi,j):(f,a[:,j]) for fi,(f,a) in enumerate(spectra) for j in cols}
+    #the time series themselves are not plotted
+    data=[(np.empty(0),np.empty((0,len(dcols))))]*len(files)
+    show_timing('computed spectra while reading all files')
+  else:
+    #parse all requested columns of all files at once (or retrieve them from the cache, which always has complete files)
+    with profile.stage('read') as stage:
+      data=read_files(files,njobs,*read_args)
+      stage['rows']=sum(len(t) for t,_ in data)
+    show_timing('read all files')
+  #spectra of all series of each file at once (and of different files in parallel), not needed with --diff-ref
+  if parsed.asd and diff_ref is None and asd_data is None:
+    import spectra as sp
+    #only the first two series are needed with --diff (same order as below)
+    asd_cols=[[j for j,di in enumerate(dcols) if not di in stdcols and (not parsed.diff or fi*len(dcols)+j<2)]
+      for fi in range(len(files))]
+    inputs=[]
+    for fi,(t,d) in enumerate(data):
+      dx=xstep(t)
+      if parsed.gauss[0]>0:
+        y=np.column_stack([smooth(t,d[:,j],parsed.gauss[0],dx) for j in asd_cols[fi]])
+      else:
+        y=d[:,asd_cols[fi]]
+      inputs.append((t,y,1/dx))
+    with profile.stage('asd',sum(y.size for _,y,_ in inputs)):
+      spectra=sp.asd_many(inputs,njobs,parsed.asd_method[0],parsed.asd_window_name[0],parsed.asd_window_width[0],
+        parsed.asd_oversampling[0],parsed.asd_nfreq[0],parsed.asd_segment[0])
+    asd_data={}
+    for fi,(f,a) in enumerate(spectra):
+      for k,j in enumerate(asd_cols[fi]):
+        asd_data[fi,j]=(f,a[:,k])
+    show_timing('computed spectra')
+  for fi,fn in enumerate(files):
     if isdone:
       continue
-    with open(fn, 'r') as f:
-      d = f.read().splitlines()
-    for di in dcols:
+    t,d=data[fi]
+    for j,di in enumerate(dcols):
       if isdone:
         continue
-      x=[]
-      y=[]
       if di in stdcols:
         if len(parsed.files)==1:
           dataname=labels[di-1]
@@ -375,39 +754,25 @@ if __name__ == '__main__':
           dataname=labels[di]
         else:
           dataname=filelabels[fi]+' '+labels[di]
-      #loop over the data
-      for l in d:
-        dl=re.split('[\t, ]+',l)
-        # if parsed.debug:
-        #   print(f"dl   : {dl}")
-        if parsed.x_date_format == 'none':
-          try:
-            t=float(dl[tcol])
-          except  ValueError:
-            continue
-        else:
-          try:
-            t=datetime.strptime(dl[tcol],parsed.x_date_format[0])
-          except  ValueError:
-            continue
-        if parsed.x_date_format != 'none' or (\
-          parsed.start_x[0]-parsed.widen[0] <= t and \
-            parsed.end_x[0]+parsed.widen[0] >= t \
-        ):
-          x.append(t)
-          y.append(float(dl[di]))
+      #pick the data
+      x=t
+      y=d[:,j]
       if parsed.debug:
         print(f"x={x[0:3]}...{x[-3:]}")
         print(f"y={y[0:3]}...{y[-3:]}")
+      rm.append(0)
       if not di in stdcols:
         if parsed.logy and demean:
           print("WARNING: --demean and --logy are incompatible, ignoring --demean")
         else:
           #compute mean if requested (branching inside this function)
           y,dataname,mean=handle_mean(y,dataname,mean,demean)
+          rm[-1]=mean[-1]
       #save data
       rx.append(x)
       ry.append(y)
+      rn.append(dataname)
+      rstd.append(di in stdcols)
       if parsed.debug:
         print(f"ri={ri}")
         print(f"rx[{dataname}]={rx[ri][0:3]}...{rx[ri][-3:]}")
@@ -415,63 +780,33 @@ if __name__ == '__main__':
 
       #branch on type of data to plot
       if di in stdcols:
-        if parsed.html:
-          print("NOTICE: 'std' columns not yet implemented for html plots")
-        else:
-          dataname=dataname+"_std"
-          clr[dataname]=f"C{ci}"
-          if parsed.debug:
-            print(f"clr[{dataname}]={clr[dataname]}")
-          #save confidence interval
-          plot_data[dataname]=[
-            pd.Series(np.array(ry[ri-1])-2*np.array(ry[ri]),index=rx[ri]),
-            pd.Series(np.array(ry[ri-1])+2*np.array(ry[ri]),index=rx[ri])
-          ]
-      else:
-        #save line color index
-        ci+=1
+        dataname=dataname+"_std"
         clr[dataname]=f"C{ci}"
         if parsed.debug:
-            print(f"clr[{dataname}]={clr[dataname]}")
-        #get plot data
-        plot_data[dataname]=series_wrapper(rx[ri],ry[ri],parsed.logy,
-          parsed.gauss[0],parsed.asd,parsed.asd_method[0],
-          parsed.asd_window_name[0],parsed.asd_window_width[0])
-
-      if parsed.diff and ri==1:
-        #set datame
-        dataname="diff"
-        # #get common time domain
-        # xc=np.unique(np.concatenate((rx[0],rx[1])))
-        #get intersection time domain
-        xc=sorted(list(set(rx[0]) & set(rx[1])))
-        #get interpolants for both time series
-        ry0=interp1d(np.array(rx[0]),np.array(ry[0]))
-        ry1=interp1d(np.array(rx[1]),np.array(ry[1]))
-        #computing residuals between both interpolated time domains
-        res=ry0(xc)+mean[0]-ry1(xc)-mean[1]
-        if parsed.debug:
-          print(f"res[{dataname}]={res[0:3]}...{res[-3:]}")
-        #compute mean if requested
-        if demean:
-          res,dataname,mean=handle_mean(res,dataname,mean,demean)
-          if parsed.debug:
-            print(f"res[{dataname}]={res[0:3]}...{res[-3:]}")
+          print(f"clr[{dataname}]={clr[dataname]}")
+        #save confidence interval
+        plot_data[dataname]=[
+          pd.Series(ry[ri-1]-2*ry[ri],index=rx[ri],copy=False),
+          pd.Series(ry[ri-1]+2*ry[ri],index=rx[ri],copy=False)
+        ]
+      else:
         #save line color index
         ci+=1
         clr[dataname]=f"C{ci}"
         if parsed.debug:
-          print(f"clr[{dataname}]={clr[dataname]}")
-        #save data
-        plot_data[dataname]=series_wrapper(xc,res,parsed.logy,
-          parsed.gauss[0],parsed.asd,parsed.asd_method[0],
-          parsed.asd_window_name[0],parsed.asd_window_width[0])
-        # plot_wrapper(xc,res,'diff',
-        #   parsed.logy,parsed.gauss[0],parsed.asd,
-        #   "C"+str(ci),parsed.x_date_format!="none")
-        if parsed.debug:
-          print(f"rx[ diff ]={ xc[0:3]}...{ xc[-3:]}")
-          print(f"ry[ diff ]={res[0:3]}...{res[-3:]}")
+            print(f"clr[{dataname}]={clr[dataname]}")
+        #get plot data (with --diff-ref, only the differences are plotted)
+        if diff_ref is not None:
+          pass
+        elif parsed.asd:
+          plot_data[dataname]=to_series(*asd_data[fi,j])
+        else:
+          plot_data[dataname]=series_wrapper(rx[ri],ry[ri],parsed.logy,
+            parsed.gauss[0],parsed.asd,parsed.asd_method[0],
+            parsed.asd_window_name[0],parsed.asd_window_width[0],parsed.asd_oversampling[0],parsed.asd_nfreq[0],parsed.asd_segment[0])
+
+      if parsed.diff and ri==1 and diff_ref is None:
+        add_diff(0,1,"diff")
         #ignore remaining time series
         isdone=True
 
@@ -479,29 +814,50 @@ if __name__ == '__main__':
       isplotted=True
     show_timing('gathered data from {f}'.format(f=fn))
 
+  #differences of all time series relative to the reference one, which replace them in the plot
+  if diff_ref is not None and isplotted:
+    series=[i for i in range(ri) if not rstd[i]]
+    if not -len(series)<=diff_ref<len(series):
+      raise Exception(f"--diff-ref {diff_ref} is not valid with {len(series)} time series (std columns are not counted).")
+    ref=series[diff_ref]
+    plot_data={}
+    for i in series:
+      if i!=ref:
+        add_diff(i,ref,f"{rn[i]} - {rn[ref]}")
+    show_timing('computed differences')
+
   if isplotted:
+    #decimation and building the figure, up to saving it
+    render_start=time.time()
+    render_rows=sum(len(v[0]) if isinstance(v,list) else len(v) for v in plot_data.values())
     if parsed.html:
       # Create new document with default CSS style
       document = HTMLDocument()
       # Set document title
       document.set_title(title)
-      # gather plot data
-      pdat={}
+      #one trace per series, with only as many points as can be seen (and its own x values)
+      fig=go.Figure()
+      npixels=parsed.width[0]*96
+      colors=plotly.colors.qualitative.Plotly
       for dataname in plot_data.keys():
         show_timing(f"start plotting {dataname}")
+        #same colors as plotly's default sequence, with the bands in the color of their series
+        color=colors[(int(clr[dataname][1:])-1)%len(colors)]
         if dataname[-4:]=="_std":
-          print("WARNING: unfinished '_std' datanames")
+          band=dc.decimate_band(plot_data[dataname],npixels,parsed.decimate[0],parsed.logx)
+          Trace=go.Scattergl if len(plot_data[dataname][0])>lod.WEBGL_POINTS else go.Scatter
+          fill='rgba({},{},{},0.3)'.format(*plotly.colors.hex_to_rgb(color))
+          #the upper limit is filled down to the lower limit, the trace before it
+          fig.add_trace(Trace(x=band[0].index,y=band[0].values,mode='lines',line={'width': 0},
+            showlegend=False,hoverinfo='skip',name=dataname))
+          fig.add_trace(Trace(x=band[1].index,y=band[1].values,mode='lines',line={'width': 0},
+            fill='tonexty',fillcolor=fill,showlegend=False,hoverinfo='skip',name=dataname))
         else:
-          # aggregate data into a data frame
-          pdat.update({dataname: plot_data[dataname]})
-      if parsed.debug:
-        print("pdat=")
-        print(pdat)
-      fig=px.line(
-        pd.DataFrame(pdat),
-        log_x=parsed.logx,
-        log_y=parsed.logy,
-      )
+          s=dc.decimate_series(plot_data[dataname],npixels,parsed.decimate[0],parsed.logx)
+          if parsed.debug:
+            print(f"decimated {dataname} from {len(plot_data[dataname])} to {len(s)} points")
+          Trace=go.Scattergl if len(plot_data[dataname])>lod.WEBGL_POINTS else go.Scatter
+          fig.add_trace(Trace(x=s.index,y=s.values,mode='lines',line={'color': color},name=dataname))
       fig.update_layout(
         title={'text': title, 'x': 0.5, 'xanchor': 'center'},
         xaxis={'title': x_label},
@@ -510,26 +866,68 @@ if __name__ == '__main__':
         width =parsed.width[ 0]*96,
         legend={'title': None},
       )
-      document.add_plotly_figure(fig)
+      if parsed.logx: fig.update_xaxes(type='log')
+      if parsed.logy: fig.update_yaxes(type='log')
+      #swap in finer levels of detail when zooming in
+      if parsed.no_html_lod or parsed.decimate[0]=='none':
+        post_script=None
+      else:
+        series={k:v for k,v in plot_data.items() if k[-4:]!="_std"}
+        post_script=lod.lod_script(fig,series,parsed.width[0]*96,parsed.decimate[0],parsed.logx,
+          parsed.html_dtype[0],parsed.html_delta_x)
+        show_timing('built levels of detail')
+      document.add_plotly_figure(fig,post_script,parsed.html_dtype[0])
+      profile.add('render',time.time()-render_start,render_rows)
       # Write to file
-      document.write(plotfilename)
+      with profile.stage('save'):
+        document.write(plotfilename,prettify=parsed.html_prettify)
+        if not parsed.no_output_cache:
+          oc.save(parsed.cache_dir[0],plotfilename,parsed.files,plot_options,get_script_version(),input_stats)
       show_timing(f"plot saved to {plotfilename}")
       if parsed.debug:
         print("------------")
     else:
       fig=plt.figure()
+      ax=fig.gca()
+      #only as many points as can be seen are plotted
+      npixels=parsed.width[0]*fig.dpi
+      #in vector file types, long series are drawn as images
+      vector=os.path.splitext(plotfilename)[-1][1:] in vector_filetypes
+      rasterized=False
+      is_date=False
+      npoints=0
       for dataname in plot_data.keys():
         show_timing(f"start plotting {dataname}")
         if dataname[-4:]=="_std":
+          band=dc.decimate_band(plot_data[dataname],npixels,parsed.decimate[0],parsed.logx)
+          raster=vector and len(band[0])>parsed.rasterize_above[0]
           plt.fill_between(
-            plot_data[dataname][0].index,
-            plot_data[dataname][0],
-            plot_data[dataname][1],
+            band[0].index,
+            band[0],
+            band[1],
             color=clr[dataname],
-            alpha=.3
+            alpha=.3,
+            rasterized=raster
           )
         else:
-          plot_data[dataname].plot(label=dataname,color=clr[dataname])
+          s=dc.decimate_series(plot_data[dataname],npixels,parsed.decimate[0],parsed.logx)
+          if parsed.debug:
+            print(f"decimated {dataname} from {len(plot_data[dataname])} to {len(s)} points")
+          raster=vector and len(s)>parsed.rasterize_above[0]
+          #straight to matplotlib, pandas plotting is slow for long series
+          ax.plot(s.index.to_numpy(),s.to_numpy(),label=dataname,color=clr[dataname],rasterized=raster)
+          is_date=is_date or np.issubdtype(s.index.dtype,np.datetime64)
+          npoints+=len(s)
+        if raster and parsed.debug:
+          print(f"rasterized {dataname}")
+        rasterized|=raster
+      #dates as pandas plots them: no margins and the date only where it changes
+      if is_date:
+        import matplotlib.dates as mdates
+        locator=mdates.AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+        ax.margins(x=0)
 
       fig.set_size_inches(parsed.width[0],parsed.height[0])
       #TODO: fix this
@@ -543,13 +941,81 @@ if __name__ == '__main__':
       if parsed.logx:    plt.xscale('log')
       if parsed.logy:    plt.yscale('log')
       plt.title(title)
-      plt.legend()
+      plt.legend(loc='best' if npoints<=LEGEND_BEST_MAX else 'upper right')
+      profile.add('render',time.time()-render_start,render_rows)
       if plotfilename=='interactive':
         plt.show()
         show_timing('plot shown')
       else:
         print(plotfilename)
-        plt.savefig(plotfilename,bbox_inches='tight')
+        with profile.stage('save'):
+          if rasterized:
+            #lines are simplified within a fraction of a pixel, which is scaled so that the images of the series are as
+            #simplified (in physical size) as at the resolution of the figure, instead of being much slower to draw
+            threshold=min(1,plt.rcParams['path.simplify_threshold']*parsed.raster_dpi[0]/fig.dpi)
+            with plt.rc_context({'path.simplify_threshold': threshold}):
+              plt.savefig(plotfilename,bbox_inches='tight',dpi=parsed.raster_dpi[0])
+          else:
+            plt.savefig(plotfilename,bbox_inches='tight')
+          if not parsed.no_output_cache:
+            oc.save(parsed.cache_dir[0],plotfilename,parsed.files,plot_options,get_script_version(),input_stats)
         show_timing(f"plot saved to {plotfilename}")
         if parsed.debug:
           print("------------")
+      #other plots may follow in this process
+      plt.close(fig)
+    return 'miss'
+
+#makes the plot defined by argv and makes it again whenever the input files change, checking them every
+#interval seconds; stops with Ctrl-C
+def watch(argv,interval):
+  files=batch.option_values(argv,'-f','--files')
+  stats=oc.input_stats(files)
+  if stats is None:
+    print("ERROR: --watch needs FILES to be regular files (pipes and the like cannot be checked for changes)")
+    sys.exit(1)
+  try:
+    while True:
+      try:
+        main(argv)
+      except Exception as e:
+        print(f"ERROR: {type(e).__name__}: {e}")
+      #FILES changed, so the plot is no longer up to date (also with --no-output-cache)
+      if not '--force' in argv:
+        argv=argv+['--force']
+      while True:
+        time.sleep(interval)
+        new_stats=oc.input_stats(files)
+        if new_stats is not None and new_stats!=stats:
+          stats=new_stats
+          break
+  except KeyboardInterrupt:
+    pass
+
+if __name__ == '__main__':
+  #batch and daemon modes are handled before the normal argument parsing, since FILES and LABELS are not needed
+  batch_parser = argparse.ArgumentParser(add_help=False)
+  batch_parser.add_argument('--batch', nargs=1, type=str, required=False)
+  batch_parser.add_argument('--jobs', nargs=1, type=int, required=False, default=[None])
+  batch_parser.add_argument('--serve', required=False, action='store_true')
+  batch_parser.add_argument('--socket', nargs=1, type=str, required=False, default=[rs.default_socket()])
+  batch_parser.add_argument('--watch', required=False, action='store_true')
+  batch_parser.add_argument('--watch-interval', nargs=1, type=float, required=False, default=[5.0])
+  batch_parsed, common_args = batch_parser.parse_known_args()
+  if batch_parsed.serve:
+    preload()
+    rs.serve(main,batch_parsed.socket[0])
+  elif batch_parsed.watch:
+    #--jobs is also an option of each plot
+    if batch_parsed.jobs[0] is not None:
+      common_args+=['--jobs',str(batch_parsed.jobs[0])]
+    watch(common_args,batch_parsed.watch_interval[0])
+  elif batch_parsed.batch is None:
+    main()
+  else:
+    jobs=[j+common_args for j in batch.read_manifest(batch_parsed.batch[0])]
+    failed,results=batch.run(main,jobs,batch_parsed.jobs[0] or 1)
+    print(f"{results['hit']} plots up to date, {results['miss']} plots made, {len(failed)} failed")
+    for j in failed:
+      print("ERROR: failed job: "+' '.join(j))
+    sys.exit(1 if failed else 0)
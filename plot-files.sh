@@ -232,10 +232,6 @@ then
   fi
 fi
 
-# https://serverfault.com/questions/133692/how-to-display-certain-lines-from-a-text-file-in-linux
-# middle() { local s=$1; local COL=$2; shift 2; sed -n "$s,$(( s+COL-1 ))p; $(( s+COL ))q" "$@"; }
-middle() { sed -n ''$1',+'$2'p' $3; }
-
 if [ ! -z "$START" ] || [ ! -z "$LEN" ]
 then
   echo "Slicing files from $START with length $LEN:"
@@ -243,19 +239,19 @@ then
   for ((f=0;f<${#FILE_LIST[@]};f++))
   do
     $DEBUG && echo ${FILE_LIST[f]}
-    FILE_LEN=$(cat ${FILE_LIST[f]} | wc -l)
-    $DEBUG && echo "file      length : $FILE_LEN"
+    #byte offset of the closest indexed line before START and number of lines to skip from there,
+    #using the same line index as plot-files.py (built/updated as needed and saved next to the file)
+    read OFFSET SKIP <<< $($(cd $(dirname $BASH_SOURCE);pwd)/line_index.py ${FILE_LIST[f]} $(( START-1 )))
+    $DEBUG && echo "indexed   offset : $OFFSET (skipping $SKIP lines)"
+    #get section from original file and put it in temp file
+    TMPFILE=/tmp/$(basename $BASH_SOURCE).$RANDOM.$RANDOM
     if [ -z "$LEN" ]
     then
-      LEN_NOW=$(( FILE_LEN - START +1 ))
-      $DEBUG && echo "computed  length : $LEN_NOW"
+      tail -c +$(( OFFSET+1 )) ${FILE_LIST[f]} | tail -n +$(( SKIP+1 )) > $TMPFILE
     else
-      LEN_NOW=$LEN
-      $DEBUG && echo "requested length : $LEN_NOW"
+      $DEBUG && echo "requested length : $LEN"
+      tail -c +$(( OFFSET+1 )) ${FILE_LIST[f]} | tail -n +$(( SKIP+1 )) | head -n $LEN > $TMPFILE
     fi
-    #get section from original file and put it in temp file
-    TMPFILE=/tmp/$(basename $BASH_SOURCE).$RANDOM.$RANDOM
-    middle $START $LEN_NOW ${FILE_LIST[f]} > $TMPFILE
     $DEBUG && echo "actual    length : $(cat $TMPFILE | wc -l)"
     FILE_LIST[f]=$TMPFILE
   done
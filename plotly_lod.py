@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+#####################
+# plotly_lod.py
+#   Levels of detail for plotly figures in html files: the figure starts with the coarsest level of
+#   each trace and a small script swaps in finer levels for the visible x-range when zooming/panning
+#   (all levels are embedded in the html file, as base64 typed arrays, no server is needed)
+#####################
+
+import json
+import base64
+import numpy as np
+import decimation as dc
+
+#the finest level with at least this many points per pixel in the visible x-range is used
+POINTS_PER_PIXEL=2
+#series with more points than this are drawn with WebGL (plotly's Scattergl), as plotly express does
+WEBGL_POINTS=1000
+#dtypes the data can be encoded with, and their names in plotly (javascript typed arrays)
+DTYPES={'float32':'f4','float64':'f8'}
+
+#javascript run after the plot is created, {plot_id} is replaced by plotly with the id of the plot div
+#and LOD_DATA with the json of the levels of detail
+LOD_SCRIPT='''
+var gd=document.getElementById('{plot_id}');
+var lod=LOD_DATA;
+//converts the arrays encoded by encode() into typed arrays
+function decode(a){
+  var s=atob(a.bdata),b=new Uint8Array(s.length);
+  for(var i=0;i<s.length;i++){b[i]=s.charCodeAt(i)}
+  var v=(a.dtype=='f4')?new Float32Array(b.buffer):new Float64Array(b.buffer);
+  if(a.first===undefined){return v}
+  var out=new Float64Array(v.length+1);
+  out[0]=a.first;
+  for(var i=0;i<v.length;i++){out[i+1]=out[i]+v[i]}
+  return out;
+}
+lod.traces.forEach(function(t){
+  t.levels.forEach(function(l){l.x=decode(l.x); l.y=decode(l.y)});
+});
+//position of the first element of a (sorted) that is not smaller than v
+function lower(a,v){
+  var lo=0,hi=a.length;
+  while(lo<hi){var mid=(lo+hi)>>1; if(a[mid]<v){lo=mid+1}else{hi=mid}}
+  return lo;
+}
+//position of the first element of a (sorted) that is larger than v
+function upper(a,v){
+  var lo=0,hi=a.length;
+  while(lo<hi){var mid=(lo+hi)>>1; if(a[mid]<=v){lo=mid+1}else{hi=mid}}
+  return lo;
+}
+//converts plotly axis range values to the units of the x data in lod
+function to_x(v){
+  if(lod.date){
+    if(typeof v==='number'){return v}
+    //plotly date strings have no time zone (they are the same as UTC here) and may have no time
+    var s=String(v).replace(' ','T');
+    if(s.length==10){s+='T00:00'}
+    return Date.parse(s+'Z');
+  }
+  if(lod.logx){return Math.pow(10,v)}
+  return v;
+}
+function update(range){
+  var xs=[],ys=[],idx=[];
+  lod.traces.forEach(function(t){
+    var level=t.levels[0],i0=0,i1=level.x.length;
+    if(range){
+      for(var l=0;l<t.levels.length;l++){
+        level=t.levels[l];
+        i0=lower(level.x,range[0]);
+        i1=upper(level.x,range[1]);
+        //the coarsest level has about npoints points, a couple of them may be just outside the range
+        if(i1-i0>=lod.npoints-2){break}
+      }
+      //include the points just outside the range, so that the lines reach the edges
+      i0=Math.max(i0-1,0);
+      i1=Math.min(i1+1,level.x.length);
+    }
+    xs.push(level.x.slice(i0,i1));
+    ys.push(level.y.slice(i0,i1));
+    idx.push(t.index);
+  });
+  Plotly.restyle(gd,{x:xs,y:ys},idx);
+}
+gd.on('plotly_relayout',function(ev){
+  if(ev['xaxis.autorange']){update(null)}
+  else if(ev['xaxis.range[0]']!==undefined){update([to_x(ev['xaxis.range[0]']),to_x(ev['xaxis.range[1]'])])}
+  else if(ev['xaxis.range']!==undefined){update([to_x(ev['xaxis.range'][0]),to_x(ev['xaxis.range'][1])])}
+});
+'''
+
+#converts the x values to what can be used in javascript (dates become milliseconds since the epoch)
+def js_x(x):
+  x=np.asarray(x)
+  if np.issubdtype(x.dtype,np.datetime64):
+    return x.astype('datetime64[ms]').astype(np.int64)
+  return x
+
+#encodes the values of a as a dict with the base64 of their bytes (little-endian, as dtype), which takes
+#less space than decimal text and is decoded faster; if delta, the differences between consecutive values
+#are encoded instead (with the first value as 'first'), so that e.g. times with large offsets (dates) keep
+#their precision as float32: the values are first rounded to a grid (a power of two, as fine as the
+#differences next to each value allow) on which the differences are exact as dtype and their running sum,
+#as done by decode(), is exact as float64, so that the rounding errors do not add up along the series
+def encode(a,dtype='float64',delta=False):
+  a=np.asarray(a,dtype=float)
+  out={}
+  if delta and len(a)>0:
+    a=delta_grid(a,np.finfo(dtype).nmant)
+    out['first']=float(a[0])
+    a=np.diff(a)
+  out['dtype']=DTYPES[dtype]
+  out['bdata']=base64.b64encode(a.astype('<'+DTYPES[dtype]).tobytes()).decode()
+  return out
+
+#rounds the values of a to the grid used by encode: the spacing of the grid at each value is the smallest
+#power of two with which the differences to its neighbours fit in nmant bits (one less than the precision of
+#the dtype, for the change the rounding makes to them) and the value itself in the precision of float64
+def delta_grid(a,nmant):
+  d=np.abs(np.diff(a))
+  d=np.maximum(np.concatenate((d,[0])),np.concatenate(([0],d)))
+  spacing=np.maximum(d*2.0**-nmant,np.abs(a)*2.0**-np.finfo(float).nmant)
+  spacing=np.ldexp(1.0,np.frexp(np.maximum(spacing,np.finfo(float).tiny))[1])
+  return np.round(a/spacing)*spacing
+
+#returns the script (to be given as post_script to plotly.io.to_html) that swaps the levels of detail of
+#the traces of fig with the names in series (a dict of pandas series, with the complete data); the y values
+#are embedded as dtype, the x values as float64 (so that large values keep their precision) or, if delta_x,
+#delta-encoded as dtype (see encode)
+def lod_script(fig,series,npixels,method='minmax',logx=False,dtype='float64',delta_x=False):
+  traces=[]
+  is_date=False
+  for i,trace in enumerate(fig.data):
+    if not trace.name in series:
+      continue
+    s=series[trace.name]
+    is_date=is_date or np.issubdtype(np.asarray(s.index).dtype,np.datetime64)
+    x=js_x(s.index)
+    y=np.asarray(s.values)
+    traces.append({
+      'index': i,
+      'levels': [{'x': encode(x[l],dtype if delta_x else 'float64',delta_x), 'y': encode(y[l],dtype)}
+        for l in dc.pyramid_index(s.index,y,npixels,method,logx)],
+    })
+  data={
+    'npoints': int(POINTS_PER_PIXEL*npixels),
+    'logx': logx,
+    'date': is_date,
+    'traces': traces,
+  }
+  data=json.dumps(data,separators=(',',':'))
+  return LOD_SCRIPT.replace('LOD_DATA',data)
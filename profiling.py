@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+#####################
+# profiling.py
+#   Records the time spent in each stage of a plot (and the rows processed there), the peak memory use and
+#   whatever else describes the plot, and writes it all as one json line, so that the records of many runs
+#   can be aggregated (e.g. to find the inputs and modes that take most of the time)
+#####################
+
+import os
+import sys
+import json
+import time
+import resource
+import tracemalloc
+import contextlib
+
+#the peak resident set size is given in KB by Linux and in bytes by macOS
+RSS_UNITS=1 if sys.platform=='darwin' else 1024
+
+#returns the peak resident set size of this process (or of the largest of its finished child processes) in MB
+def peak_rss(who=resource.RUSAGE_SELF):
+  return resource.getrusage(who).ru_maxrss*RSS_UNITS/1024**2
+
+class Profile:
+  #nothing is recorded unless enabled; if memory, the peak of the memory allocated by python (and numpy) is
+  #traced as well, which is slower
+  def __init__(self,enabled=False,memory=False):
+    self.enabled=enabled
+    self.memory=memory
+    self.info={}
+    self.stages={}
+    self.start=time.time()
+  #adds seconds (and rows) to stage name
+  def add(self,name,seconds,rows=None):
+    if not self.enabled:
+      return
+    s=self.stages.setdefault(name,{'seconds': 0.0})
+    s['seconds']+=seconds
+    if rows is not None:
+      s['rows']=s.get('rows',0)+int(rows)
+  #context manager that adds the time spent in it to stage name; rows can be given here or set afterwards
+  #in the dict that is returned
+  @contextlib.contextmanager
+  def stage(self,name,rows=None):
+    out={'rows': rows}
+    t0=time.time()
+    try:
+      yield out
+    finally:
+      self.add(name,time.time()-t0,out['rows'])
+  #starts tracing memory allocations, if requested
+  def __enter__(self):
+    if self.enabled and self.memory:
+      tracemalloc.start()
+    self.start=time.time()
+    return self
+  def __exit__(self,*exc):
+    if self.enabled and self.memory:
+      self.info['peak_traced_mb']=tracemalloc.get_traced_memory()[1]/1024**2
+      tracemalloc.stop()
+    return False
+  #returns the record of this run
+  def record(self):
+    out={'time': time.strftime('%Y-%m-%dT%H:%M:%S',time.localtime(self.start))}
+    out.update(self.info)
+    plot=out.get('plot')
+    if plot is not None and os.path.isfile(plot):
+      out['output_bytes']=os.path.getsize(plot)
+    out['stages']=self.stages
+    out['seconds']=time.time()-self.start
+    out['peak_rss_mb']=peak_rss()
+    out['peak_rss_children_mb']=peak_rss(resource.RUSAGE_CHILDREN)
+    return out
+  #appends the record as a json line to filename ('-' is stderr); lines are written at once, so that
+  #concurrent runs can share the same file
+  def write(self,filename):
+    if not self.enabled:
+      return
+    line=json.dumps(self.record(),default=str)+'\n'
+    if filename=='-':
+      sys.stderr.write(line)
+      sys.stderr.flush()
+      return
+    with open(filename,'a') as f:
+      f.write(line)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+#####################
+# render_server.py
+#   Keeps a warm process (with all modules imported and recently parsed data in memory) that makes
+#   plots on request, over a Unix domain socket; each request is the list of command line arguments
+#   of one plot and the reply has the exit status and all output of making it
+#####################
+
+import os
+import io
+import json
+import signal
+import socket
+import tempfile
+import traceback
+import contextlib
+import socketserver
+
+#default location of the socket, one per user
+def default_socket():
+  return os.path.join(os.environ.get('XDG_RUNTIME_DIR',tempfile.gettempdir()),f"plot-files-{os.getuid()}.sock")
+
+#reads everything the other side sends until it stops sending (None if nothing was sent)
+def receive(sock):
+  chunks=[]
+  while True:
+    chunk=sock.recv(65536)
+    if not chunk:
+      break
+    chunks.append(chunk)
+  if not chunks:
+    return None
+  return json.loads(b''.join(chunks).decode())
+
+#sends msg and tells the other side there's nothing else to send
+def send(sock,msg):
+  sock.sendall(json.dumps(msg).encode())
+  sock.shutdown(socket.SHUT_WR)
+
+#runs func(argv) in cwd and returns its exit status and everything it printed
+def run(func,argv,cwd):
+  out=io.StringIO()
+  status=0
+  here=os.getcwd()
+  with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+    try:
+      os.chdir(cwd)
+      func(argv)
+    except SystemExit as e:
+      status=e.code if isinstance(e.code,int) else (0 if e.code is None else 1)
+      if not isinstance(e.code,(int,type(None))):
+        print(e.code)
+    except Exception:
+      traceback.print_exc()
+      status=1
+    finally:
+      os.chdir(here)
+  return status,out.getvalue()
+
+#serves requests one at a time (plotting libraries are not thread-safe) until interrupted
+def serve(func,socket_path=None):
+  if socket_path is None:
+    socket_path=default_socket()
+  class Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+      msg=receive(self.request)
+      #just checking if the daemon is there
+      if msg is None:
+        return
+      status,output=run(func,msg['argv'],msg['cwd'])
+      send(self.request,{'status':status,'output':output})
+  #remove stale sockets, left over by daemons that did not exit cleanly
+  if os.path.exists(socket_path):
+    if request(socket_path,None) is not None:
+      raise RuntimeError(f"There is already a daemon listening on {socket_path}.")
+    os.remove(socket_path)
+  #the socket is only accessible to this user
+  umask=os.umask(0o077)
+  try:
+    server=socketserver.UnixStreamServer(socket_path,Handler)
+  finally:
+    os.umask(umask)
+  print(f"listening on {socket_path}",flush=True)
+  #kill (SIGTERM) stops the daemon cleanly, same as Ctrl-C
+  signal.signal(signal.SIGTERM,signal.default_int_handler)
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+    os.remove(socket_path)
+
+#sends argv to the daemon listening on socket_path and returns its exit status and output, or None if
+#there is no daemon; with argv None, only checks that the daemon is there
+def request(socket_path,argv):
+  if socket_path is None:
+    socket_path=default_socket()
+  try:
+    sock=socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    sock.connect(socket_path)
+  except OSError:
+    return None
+  with sock:
+    if argv is None:
+      return 0,''
+    send(sock,{'argv':list(argv),'cwd':os.getcwd()})
+    msg=receive(sock)
+  return msg['status'],msg['output']
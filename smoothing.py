@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+#####################
+# smoothing.py
+#   Gaussian smoothing that scales to wide windows: direct convolution for short windows, FFT convolution
+#   for longer ones and a cascade of moving averages (which converges to a Gaussian) for the widest; data
+#   gaps are not smoothed over and irregularly sampled data can be smoothed as such
+#####################
+
+import numpy as np
+from scipy import signal
+from scipy import ndimage
+
+#available methods
+METHODS=['auto','direct','fft','box']
+#with method auto, windows with up to this many points are convolved directly and windows with at least
+#BOX_MIN points are approximated by moving averages (all others are convolved with FFTs)
+DIRECT_MAX=64
+BOX_MIN=2**20
+#number of moving averages approximating the Gaussian
+BOX_PASSES=3
+#by default, spacings larger than this many times the typical step are gaps
+GAP_FACTOR=1.5
+
+#Gaussian window with 3-sigma width (same units as dx), sampled every dx and normalized to unit sum
+def gauss_window(width,dx):
+  x=np.linspace(-width/dx/2, width/dx/2, int(width/dx+1))
+  sigma=width/dx/3
+  y=1/np.sqrt(2*np.pi*sigma**2) * np.exp(-(x**2)/(2*sigma**2))
+  y=y/np.sum(y)
+  return y
+
+#variance (in samples squared) of the Gaussian window with 3-sigma width of npoints points, which is less than
+#(npoints/3)**2 since the window is truncated at 1.5 sigma
+def window_variance(npoints):
+  w=gauss_window(npoints,1)
+  x=np.linspace(-npoints/2,npoints/2,len(w))
+  return np.sum(w*x**2)
+
+#returns the method used for a window with npoints points
+def pick_method(npoints,method='auto'):
+  if method!='auto':
+    return method
+  if npoints<=DIRECT_MAX:
+    return 'direct'
+  if npoints<BOX_MIN:
+    return 'fft'
+  return 'box'
+
+#convolves y with the Gaussian window with 3-sigma width of npoints points, keeping the length of y (the
+#data is zero beyond its ends, as with numpy.convolve(...,'same'))
+def convolve(y,npoints,method='auto'):
+  method=pick_method(npoints,method)
+  if method=='box':
+    #widths of the moving averages with the same variance as the (truncated) Gaussian window, Kovesi (2010),
+    #Fast almost-Gaussian filtering, DICTA; odd widths, so that the averages are centered
+    var=window_variance(npoints)
+    wl=int(np.sqrt(12*var/BOX_PASSES+1))
+    wl-=(wl+1)%2
+    wu=wl+2
+    m=round((12*var-BOX_PASSES*wl**2-4*BOX_PASSES*wl-3*BOX_PASSES)/(-4*wl-4))
+    for i in range(BOX_PASSES):
+      y=ndimage.uniform_filter1d(y,wl if i<m else wu,mode='constant')
+    return y
+  w=gauss_window(npoints,1)
+  if method=='direct':
+    #the middle of the full convolution, since 'same' returns max(len(y),len(w)) samples
+    return np.convolve(y,w,'full')[(len(w)-1)//2:][:len(y)]
+  if method=='fft':
+    return signal.fftconvolve(y,w,'same')
+  raise ValueError(f"unknown smoothing method '{method}', expecting one of {METHODS}")
+
+#returns the slices of x between gaps (spacings larger than max_gap)
+def segments(x,max_gap):
+  edges=np.flatnonzero(np.diff(x)>max_gap)+1
+  return [slice(a,b) for a,b in zip(np.concatenate(([0],edges)),np.concatenate((edges,[len(x)])))]
+
+#smooths y (sampled at x, every dx) with a Gaussian window with 3-sigma width (same units as x); each stretch
+#of data between gaps larger than max_gap (defaults to GAP_FACTOR*dx) is smoothed separately, with the window
+#normalized to the data within the stretch (a constant stays constant up to the gaps); if irregular,
+#y is smoothed as a function of x (with a Gaussian-weighted average of the data around each x, binned every
+#dx), otherwise y is assumed to be evenly spaced by dx
+def smooth(x,y,width,dx,method='auto',max_gap=None,irregular=False):
+  x=np.asarray(x,dtype=float)
+  #float32 data stays float32
+  y=np.asarray(y)
+  if y.dtype.kind!='f':
+    y=y.astype(float)
+  if max_gap is None:
+    max_gap=GAP_FACTOR*dx
+  npoints=width/dx
+  out=np.empty_like(y)
+  for s in segments(x,max_gap):
+    if not irregular:
+      #divided by the smoothed ones, so that the data near the gaps is not pulled towards the zeros beyond them
+      out[s]=convolve(y[s],npoints,method)/convolve(np.ones(s.stop-s.start),npoints,method)
+      continue
+    #sums of y and number of points in each bin, smoothed the same way, give the weighted averages
+    i=np.rint((x[s]-x[s][0])/dx).astype(np.int64)
+    total=convolve(np.bincount(i,weights=y[s]).astype(float),npoints,method)
+    count=convolve(np.bincount(i).astype(float),npoints,method)
+    out[s]=total[i]/count[i]
+  return out
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+#####################
+# spectra.py
+#   Amplitude spectral densities of many series at once: all series sampled at the same x are stacked
+#   as the columns of one 2-D array, so that detrending, windowing and the FFTs are done in one call
+#   (with the same window and segments for all), and different x are spread over a pool of processes
+#####################
+
+import concurrent.futures
+import numpy as np
+from scipy import signal
+
+#available methods
+METHODS=['periodogram','welch','lombscargle']
+#default oversampling of the lombscargle frequencies (relative to the inverse of the time span)
+DEFAULT_OVERSAMPLING=4
+#number of grid points each sample is spread over in fast_lombscargle
+EXTIRPOLATION_POINTS=4
+#number of samples of the welch segments processed at once by Welch
+SEGMENT_BATCH=2**20
+
+#spreads (extirpolates) the values y at the (fractional) positions p onto a periodic grid with n points, so
+#that sums of y*exp(i*w*p) are the same as those over the grid, for frequencies w well below the grid spacing
+#(Press and Rybicki, 1989, Fast algorithm for spectral analysis of unevenly sampled data, ApJ 338)
+def extirpolate(p,y,n,m=EXTIRPOLATION_POINTS):
+  lo=np.floor(p).astype(np.int64)-(m-1)//2
+  d=p-lo
+  grid=np.zeros(n)
+  #Lagrange interpolation weights of the m grid points around each position
+  for j in range(m):
+    w=np.ones_like(d)
+    den=1.0
+    for i in range(m):
+      if i!=j:
+        w*=d-i
+        den*=j-i
+    grid+=np.bincount((lo+j)%n,weights=y*w/den,minlength=n)
+  return grid
+
+#returns the sums of exp(i*w*x) (if y is None) or of y*exp(i*w*x) for the frequencies k*df (k=1..nfreq),
+#with positions computed for the given grid of n points
+def fast_sums(x,y,df,nfreq,n):
+  p=np.mod(x*df*n,n)
+  grid=extirpolate(p,np.ones_like(x) if y is None else y,n)
+  #the sign of the imaginary part of rfft is reversed, because of its negative exponent
+  return np.conj(np.fft.rfft(grid)[1:nfreq+1])
+
+#same as scipy.signal.lombscargle (with angular frequencies 2*pi*f, f=df,2*df,...,nfreq*df) for each
+#column of y, in O(N log N) instead of O(N*nfreq)
+def fast_lombscargle(x,y,df,nfreq):
+  x=np.asarray(x,dtype=float)
+  x=x-x[0]
+  n=len(x)
+  #grid large enough for the extirpolation to be accurate at twice the highest frequency
+  ngrid=2**int(np.ceil(np.log2(4*EXTIRPOLATION_POINTS*nfreq)))
+  #sums at 2w, needed for the time offset tau, are the same for all columns
+  w2=fast_sums(2*x,None,df,nfreq,ngrid)
+  hypo=np.abs(w2)
+  hypo[hypo==0]=1
+  hc2wt=0.5*w2.real/hypo
+  hs2wt=0.5*w2.imag/hypo
+  cwt=np.sqrt(0.5+hc2wt)
+  swt=np.copysign(np.sqrt(np.maximum(0.5-hc2wt,0)),hs2wt)
+  #sum of cos(w*(x-tau))**2 (and of sin**2, which is n minus this)
+  den=0.5*n+hc2wt*w2.real+hs2wt*w2.imag
+  p=np.empty((nfreq,y.shape[1]))
+  for j in range(y.shape[1]):
+    w1=fast_sums(x,y[:,j],df,nfreq,ngrid)
+    cterm=(cwt*w1.real+swt*w1.imag)**2/den
+    sterm=(cwt*w1.imag-swt*w1.real)**2/(n-den)
+    p[:,j]=0.5*(cterm+sterm)
+  return p
+
+#returns the length in samples of the welch segments given as spec: a number of samples (e.g. '4096') or of
+#seconds (e.g. '600s', same units as x), converted with the sampling frequency fs
+def segment_length(spec,fs):
+  if spec.endswith('s'):
+    n=int(round(float(spec[:-1])*fs))
+  else:
+    n=int(spec)
+  if n<2:
+    raise ValueError(f"welch segments of '{spec}' have less than 2 samples (sampling frequency is {fs})")
+  return n
+
+#Welch's average of the periodograms of the (overlapping, linearly detrended and windowed) segments with
+#nperseg samples of each column of y, same as scipy.signal.welch, computed as y is given block by block (see
+#add), so that only the samples of the last (incomplete) segment are kept in memory
+class Welch:
+  def __init__(self,fs,nperseg,window_name='hann',noverlap=None):
+    self.fs=fs
+    self.nperseg=nperseg
+    self.window_name=window_name
+    self.step=nperseg-(nperseg//2 if noverlap is None else noverlap)
+    self.window=signal.get_window(window_name,nperseg)
+    self.tail=None
+    self.total=None
+    self.count=0
+  #adds the next rows of y (2-D, one column per series)
+  def add(self,y):
+    y=np.asarray(y,dtype=float)
+    if self.tail is not None and len(self.tail)>0:
+      y=np.concatenate((self.tail,y))
+    nseg=(len(y)-self.nperseg)//self.step+1 if len(y)>=self.nperseg else 0
+    if nseg>0:
+      #segments x columns x samples, without copying y
+      seg=np.lib.stride_tricks.sliding_window_view(y,self.nperseg,axis=0)[:(nseg-1)*self.step+1:self.step]
+      #a few segments at a time, so that the temporary arrays stay small
+      batch=max(1,SEGMENT_BATCH//(self.nperseg*y.shape[1]))
+      for i in range(0,nseg,batch):
+        p=np.sum(np.abs(np.fft.rfft(signal.detrend(seg[i:i+batch],axis=-1,type='linear')*self.window,axis=-1))**2,axis=0)
+        self.total=p if self.total is None else self.total+p
+      self.count+=nseg
+    #a copy, so that the (possibly large or memory-mapped) y is not referenced
+    self.tail=np.array(y[nseg*self.step:])
+    return self
+  #returns the frequencies and the one-sided power spectral density of each column, as a 2-D array with one
+  #column per series; if not even one segment is complete, the data is taken as a single shorter segment (as
+  #scipy.signal.welch does)
+  def psd(self):
+    if self.count==0:
+      if self.tail is None or len(self.tail)<2:
+        raise ValueError("not enough data to compute the welch spectrum")
+      return Welch(self.fs,len(self.tail),self.window_name).add(self.tail).psd()
+    p=self.total/self.count/(self.fs*np.sum(self.window**2))
+    #one-sided, the zero and Nyquist (if any) frequencies appear only once
+    p[:,1:(-1 if self.nperseg%2==0 else None)]*=2
+    return np.fft.rfftfreq(self.nperseg,1/self.fs),p.T
+
+#removes the least-squares line (as function of x, which need not be evenly spaced) from each column of y
+def detrend(x,y):
+  a=np.column_stack((np.ones_like(x),x-x.mean()))
+  coef=np.linalg.lstsq(a,y,rcond=None)[0]
+  return y-a@coef
+
+#returns the frequencies and the one-sided amplitude spectral density [units/sqrt(Hz)] of each column of y
+#(sampled at x, with sampling frequency fs), as a 2-D array with one column per series; the data is
+#detrended beforehand; window_width is the length of the welch segments, as fraction of the length of x,
+#unless segment is given (see segment_length); lombscargle ignores fs and the window, and is computed at nfreq frequencies evenly spaced by
+#1/(oversampling*time span), by default up to the Nyquist frequency of the average sampling
+def asd(x,y,fs,method='welch',window_name='hann',window_width=0.1,oversampling=DEFAULT_OVERSAMPLING,nfreq=None,segment=None):
+  y=np.asarray(y)
+  if method=='periodogram':
+    f,p=signal.periodogram(y,fs,window_name,detrend='linear',scaling='density',return_onesided=True,axis=0)
+  elif method=='welch':
+    nperseg=int(window_width*len(x)) if segment is None else segment_length(segment,fs)
+    f,p=signal.welch(y,fs,window_name,detrend='linear',scaling='density',return_onesided=True,nperseg=nperseg,axis=0)
+  elif method=='lombscargle':
+    x=np.asarray(x,dtype=float)
+    df=1/(oversampling*(x[-1]-x[0]))
+    if nfreq is None:
+      nfreq=int(oversampling*len(x)/2)
+    f=df*np.arange(1,nfreq+1)
+    p=fast_lombscargle(x,detrend(x,y),df,nfreq)
+  else:
+    raise ValueError(f"unknown asd method '{method}', expecting one of {METHODS}")
+  return f,np.sqrt(p)
+
+#same as asd, for each (x,y,fs) in inputs, computed in njobs processes; returns the list of outputs of asd
+def asd_many(inputs,njobs=1,*args):
+  if njobs<=1 or len(inputs)<=1:
+    return [asd(x,y,fs,*args) for x,y,fs in inputs]
+  n=len(inputs)
+  with concurrent.futures.ProcessPoolExecutor(max_workers=min(njobs,n)) as pool:
+    return list(pool.map(asd,*zip(*inputs),*[[a]*n for a in args]))
@@ -0,0 +1,202 @@
+#!/bin/bash -ue
+
+# times every mode of plot-files.py (and plot-hist.sh) on synthetic data of SIZES rows and appends one json
+# line per run to RESULTS, with the version of the scripts, the wall time, the throughput, the peak memory and
+# the stages recorded by --profile, then compares this version with the previous one found in RESULTS
+#
+# the data is generated once in BENCH_DIR (it needs no network) as files of these KINDS:
+#   regular : t,x,y,z every second
+#   gappy   : same as regular, with 5% of the samples and a few long stretches missing
+#   dates   : t as ISO dates, x,y every second
+#   multi   : two regular files with the same t and different noise (used by --diff)
+#
+# all sizes, kinds and modes (SIZES="1e4 1e5 1e6 1e7 1e8" takes hours and needs about 10GB in BENCH_DIR):
+#   SIZES="1e4 1e5" KINDS="regular multi" MODES="plain diff" test/benchmark.sh
+
+DIR=$(cd $(dirname $BASH_SOURCE);pwd)
+ROOT=$(dirname $DIR)
+BENCH_DIR=${BENCH_DIR:-/tmp/plot-files-bench}
+RESULTS=${RESULTS:-$BENCH_DIR/results.jsonl}
+SIZES=${SIZES:-1e4 1e5 1e6}
+KINDS=${KINDS:-regular gappy dates multi}
+MODES=${MODES:-parse plain gauss demean diff asd-periodogram asd-welch asd-lombscargle html hist}
+VERSION=${VERSION:-$(git -C $ROOT describe --always --dirty 2>/dev/null || echo unknown)}
+TIMEOUT=${TIMEOUT:-3600}
+
+export MPLBACKEND=Agg
+mkdir -p $BENCH_DIR/data $BENCH_DIR/plots
+
+#----------------------------
+# data
+#----------------------------
+#generates the files of kind with n rows (unless they exist), named $BENCH_DIR/data/<kind>-<n>[-<i>].dat
+function generate()
+{
+python3 - $BENCH_DIR/data $1 $2 <<'PYTHON'
+import os, sys
+import numpy as np
+out,kind,n=sys.argv[1],sys.argv[2],int(float(sys.argv[3]))
+chunk=10**6
+def write(filename,seed):
+  if os.path.isfile(filename):
+    return
+  rng=np.random.default_rng(seed)
+  tmp=filename+'.tmp'
+  with open(tmp,'w') as f:
+    for i in range(0,n,chunk):
+      t=np.arange(i,min(i+chunk,n),dtype=float)
+      #a few periodic signals and noise
+      x=1e-7*np.sin(2*np.pi*t/5400)+1e-8*rng.standard_normal(len(t))
+      y=1e-7*np.cos(2*np.pi*t/600)+1e-8*rng.standard_normal(len(t))
+      z=1e-8*np.sin(2*np.pi*t/86400)+1e-9*rng.standard_normal(len(t))
+      if kind=='gappy':
+        keep=(rng.random(len(t))>0.05)&(np.mod(t,n/10)<n/10*0.9)
+        t,x,y,z=t[keep],x[keep],y[keep],z[keep]
+      if kind=='dates':
+        d=np.datetime64('2020-01-01T00:00:00')+t.astype('timedelta64[s]')
+        cols=[np.datetime_as_string(d,unit='s'),np.char.mod('%.9e',x),np.char.mod('%.9e',y)]
+      else:
+        cols=[np.char.mod('%.1f',t)]+[np.char.mod('%.9e',c) for c in (x,y,z)]
+      f.write('\n'.join(' '.join(r) for r in zip(*cols))+'\n')
+  os.replace(tmp,filename)
+base=os.path.join(out,f"{kind}-{n}")
+if kind=='multi':
+  for i in (1,2):
+    write(f"{base}-{i}.dat",i)
+else:
+  write(f"{base}.dat",0)
+#one column, for plot-hist.sh
+if kind=='regular' and not os.path.isfile(base+'.hist'):
+  with open(base+'.dat') as f, open(base+'.hist.tmp','w') as g:
+    for line in f:
+      g.write(line.split()[1]+'\n')
+  os.replace(base+'.hist.tmp',base+'.hist')
+PYTHON
+}
+
+#----------------------------
+# modes
+#----------------------------
+#prints the arguments of plot-files.py that make mode with kind (nothing if mode does not apply to kind)
+function mode_args()
+{
+  local MODE=$1 KIND=$2
+  case "$MODE-$KIND" in
+    parse-*)                           echo "--no-cache" ;;
+    plain-*|demean-*|html-*)           echo "" ;;
+    gauss-regular|gauss-gappy|gauss-multi) echo "--gauss 600" ;;
+    diff-multi)                        echo "--diff" ;;
+    asd-periodogram-regular|asd-periodogram-multi|asd-welch-regular|asd-welch-multi|asd-lombscargle-gappy) \
+                                       echo "--asd --asd-method ${MODE#asd-} --logx --logy" ;;
+    *)                                 return 1 ;;
+  esac
+  case "$MODE" in
+    demean) echo "--demean" ;;
+    html)   echo "--html"   ;;
+  esac
+}
+
+#----------------------------
+# runs
+#----------------------------
+#runs the command after the first 5 arguments (version, mode, kind, rows per file, number of files) and appends its record to RESULTS
+function measure()
+{
+python3 - $RESULTS $TIMEOUT "$@" <<'PYTHON'
+import os, sys, json, time, resource, subprocess
+results,timeout,version,mode,kind,rows,nfiles=sys.argv[1],float(sys.argv[2]),*sys.argv[3:8]
+cmd=sys.argv[8:]
+profile=results+'.profile.tmp'
+if os.path.exists(profile):
+  os.remove(profile)
+start=time.time()
+try:
+  run=subprocess.run(cmd,stdout=subprocess.DEVNULL,stderr=subprocess.PIPE,timeout=timeout)
+  status=run.returncode
+  error=run.stderr.decode(errors='replace').strip().splitlines()[-1:]
+except subprocess.TimeoutExpired:
+  status,error='timeout',[]
+seconds=time.time()-start
+#only the command (and its own children) ran in this process
+rss=resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss*(1 if sys.platform=='darwin' else 1024)/1024**2
+record={'time': time.strftime('%Y-%m-%dT%H:%M:%S',time.localtime(start)), 'version': version, 'mode': mode,
+  'kind': kind, 'rows': int(rows)*int(nfiles), 'files': int(nfiles), 'status': status, 'seconds': seconds,
+  'rows_per_second': int(rows)*int(nfiles)/seconds, 'peak_rss_mb': rss}
+if os.path.isfile(profile):
+  with open(profile) as f:
+    p=json.loads(f.readline())
+  record.update({k: p[k] for k in ('stages','output_bytes') if k in p})
+  os.remove(profile)
+with open(results,'a') as f:
+  f.write(json.dumps(record)+'\n')
+print(f"{mode:16s} {kind:8s} {rows:>10s} rows: {seconds:8.2f} s {rss:8.0f} MB {'' if status==0 else 'FAILED: '+' '.join([str(status)]+error)}")
+PYTHON
+}
+
+for N in $SIZES
+do
+  N=$(python3 -c "print(int(float('$N')))")
+  for KIND in $KINDS
+  do
+    echo "generating $KIND data with $N rows"
+    generate $KIND $N
+    if [ $KIND == multi ]
+    then
+      FILES=(--files $BENCH_DIR/data/$KIND-$N-1.dat --files $BENCH_DIR/data/$KIND-$N-2.dat)
+    else
+      FILES=(--files $BENCH_DIR/data/$KIND-$N.dat)
+    fi
+    if [ $KIND == dates ]
+    then
+      LABELS=(--labels t,x,y --x-date-format "%Y-%m-%dT%H:%M:%S")
+    else
+      LABELS=(--labels t,x,y,z)
+    fi
+    NFILES=$(( ${#FILES[@]}/2 ))
+    for MODE in $MODES
+    do
+      if [ $MODE == hist ]
+      then
+        [ $KIND == regular ] || continue
+        if ! which gnuplot > /dev/null 2>&1
+        then
+          echo "skipping hist: gnuplot is not available"
+          continue
+        fi
+        measure $VERSION $MODE $KIND $N 1 $ROOT/plot-hist.sh \
+          --files $BENCH_DIR/data/$KIND-$N.hist --out $BENCH_DIR/plots/$MODE-$KIND-$N --force
+        continue
+      fi
+      ARGS=$(mode_args $MODE $KIND) || continue
+      #the data cache is filled by the first run (or by parse, which does not use it) and used by all others
+      measure $VERSION $MODE $KIND $N $NFILES $ROOT/plot-files.py "${FILES[@]}" "${LABELS[@]}" $ARGS \
+        --out $BENCH_DIR/plots/$MODE-$KIND-$N.$([[ $MODE == html ]] && echo html || echo png) \
+        --cache-dir $BENCH_DIR/cache --force --no-output-cache --profile $RESULTS.profile.tmp
+    done
+  done
+done
+
+#----------------------------
+# comparison
+#----------------------------
+#seconds of the last run of each mode, kind and size with this version and with the previous version in RESULTS
+python3 - $RESULTS $VERSION <<'PYTHON'
+import sys, json
+version=sys.argv[2]
+with open(sys.argv[1]) as f:
+  records=[json.loads(l) for l in f if l.strip()]
+others=[r['version'] for r in records if r['version']!=version]
+if not others:
+  sys.exit()
+previous=others[-1]
+last={}
+for r in records:
+  if r['status']==0:
+    last[(r['version'],r['mode'],r['kind'],r['rows'])]=r['seconds']
+print(f"\n{'mode':16s} {'kind':8s} {'rows':>10s} {previous:>16s} {version:>16s} ratio")
+for (v,mode,kind,rows),s in last.items():
+  p=last.get((previous,mode,kind,rows))
+  if v!=version or p is None:
+    continue
+  print(f"{mode:16s} {kind:8s} {rows:10d} {p:16.2f} {s:16.2f} {s/p:5.2f}{' <-' if s>1.2*p else ''}")
+PYTHON
@@ -0,0 +1,117 @@
+#!/bin/bash -ue
+
+# checks the data cache (column_cache.py) as a copy of test.dat changes: data appended (only that is parsed),
+# an incomplete last line (not cached, but returned), that line completed, and a value edited in place without
+# changing the size of the file (everything is parsed again); after each change, the cached columns must be
+# the same as those parsed without the cache, the output cache must make the plot again (and only once) and
+# --watch must make it again
+
+DIR=$(cd $(dirname $BASH_SOURCE);pwd)
+TMP=$(mktemp -d /tmp/test-cache.XXXXXX)
+WATCH=
+trap '[ -z "$WATCH" ] || kill $WATCH; rm -rf $TMP' EXIT
+INTERVAL=${INTERVAL:-0.2}
+
+DAT=$TMP/test.dat
+head -n 8000 $DIR/test.dat > $DAT
+#--watch, the output cache and the checks of the columns use different cache directories, so that they do not
+#see each other's updates
+ARGS=(--files $DAT --labels "\-,-,t,-,x,y,z,-")
+
+#changes the file as described by the step
+function change()
+{
+  case "$1" in
+    append)  sed -n '8001,8300p' $DIR/test.dat >> $DAT ;;
+    partial) sed -n '8301p' $DIR/test.dat | head -c 40 >> $DAT ;;
+    complete)
+      sed -n '8301p' $DIR/test.dat | tail -c +41 >> $DAT
+      sed -n '8302,8400p' $DIR/test.dat >> $DAT
+    ;;
+    edit)
+      #the first digit of the 5th column of line 4001, in place
+      python3 - $DAT <<PYTHON
+import sys
+with open(sys.argv[1],'r+b') as f:
+  lines=f.read().split(b'\n')
+  pos=sum(len(l)+1 for l in lines[:4000])+lines[4000].index(b'E')-16
+  f.seek(pos)
+  c=f.read(1)
+  f.seek(pos)
+  f.write(b'9' if c!=b'9' else b'1')
+PYTHON
+    ;;
+  esac
+}
+
+#checks the columns returned with the cache and the offset the cache entry was parsed from
+function check_columns()
+{
+  cd $(dirname $DIR)
+  python3 - $DAT $TMP/columns $1 <<PYTHON
+import sys
+import numpy as np
+import column_cache as cc
+import column_reader as cr
+filename,cache_dir,step=sys.argv[1:]
+key=cc.cache_key(filename,2,[4,5,6])
+meta=cc.read_meta(f"{cache_dir}/{key}")
+offset,_=cc.valid_offset(filename,meta)
+t,y=cc.read_window(filename,2,[4,5,6],cache_dir=cache_dir)
+tr,yr=cr.read_window(filename,2,[4,5,6])
+print(f"{step:8s}: {len(t)} rows, parsed from byte {offset}")
+if not (np.array_equal(t,tr) and np.array_equal(y,yr)):
+  print("ERROR: the cached data is not the same as the data in the file")
+  sys.exit(1)
+#the data that was cached is only parsed again if it changed
+if (offset==0)!=(step in ('initial','edit')):
+  print("ERROR: the cache did not parse the right part of the file")
+  sys.exit(1)
+PYTHON
+  cd - > /dev/null
+}
+
+#checks that the output cache makes the plot again, once
+function check_output_cache()
+{
+  if $(dirname $DIR)/plot-files.py "${ARGS[@]}" --out $TMP/test.png --cache-dir $TMP/cache | grep -q "up to date"
+  then
+    echo "ERROR: the plot is up to date after '$1'"
+    exit 1
+  fi
+  if ! $(dirname $DIR)/plot-files.py "${ARGS[@]}" --out $TMP/test.png --cache-dir $TMP/cache | grep -q "up to date"
+  then
+    echo "ERROR: the plot is not up to date after making it again"
+    exit 1
+  fi
+}
+
+#plots made by --watch so far
+function watch_plots()
+{
+  grep -c "^$TMP/watch.png" $TMP/watch.log 2> /dev/null || true
+}
+
+$(dirname $DIR)/plot-files.py "${ARGS[@]}" --out $TMP/watch.png --cache-dir $TMP/watch \
+  --watch --watch-interval $INTERVAL > $TMP/watch.log 2>&1 &
+WATCH=$!
+for STEP in initial append partial complete edit
+do
+  N=$(( $(watch_plots)+1 ))
+  [ $STEP == initial ] || change $STEP
+  check_columns $STEP
+  check_output_cache $STEP
+  #--watch makes the plot again
+  for i in $(seq 200)
+  do
+    [ $(watch_plots) -lt $N ] || break
+    sleep 0.1
+  done
+  if [ $(watch_plots) -lt $N ]
+  then
+    echo "ERROR: --watch did not make the plot after '$STEP':"
+    cat $TMP/watch.log
+    exit 1
+  fi
+  echo "$STEP: plotted again by --watch and by the output cache"
+done
@@ -0,0 +1,91 @@
+#!/bin/bash -ue
+
+# checks --x-date-format: the dates parsed in bulk (date_parsing.py) must be the same as those parsed string by
+# string with datetime.strptime, for formats decoded from the characters, split into date and time or parsed
+# with strptime, including invalid dates; and --start-x, --end-x and --widen with dates must select the rows
+# in the window, with and without the data cache
+
+DIR=$(cd $(dirname $BASH_SOURCE);pwd)
+TMP=$(mktemp -d /tmp/test-dates.XXXXXX)
+trap "rm -rf $TMP" EXIT
+
+#----------------------------
+# parsing
+#----------------------------
+cd $(dirname $DIR)
+python3 - <<PYTHON
+import sys
+import numpy as np
+import date_parsing as dp
+from datetime import datetime, timezone
+def strptime(dates,x_date_format):
+  out=[]
+  for s in dates:
+    try:
+      d=datetime.strptime(s,x_date_format)
+    except ValueError:
+      out.append(None)
+      continue
+    if d.tzinfo is not None:
+      d=d.astimezone(timezone.utc).replace(tzinfo=None)
+    out.append(d)
+  return np.array(out,dtype=dp.DATE_DTYPE)
+#every 7777 seconds over 200 years (across the %y pivot), with microseconds
+rng=np.random.default_rng(0)
+t=np.datetime64('1900-01-01','us')+np.arange(0,200*365*86400,7777*10**6,dtype=np.int64).astype('timedelta64[us]')
+t=t[::50]+rng.integers(0,10**6,len(t[::50])).astype('timedelta64[us]')
+invalid=['garbage','2021-02-29T10:00:00','2020-13-01T10:00:00','2020-01-01T24:00:00','2020-01-32T10:00:00','']
+for f in ['%Y-%m-%dT%H:%M:%S','%y%m%d%H%M%S','%Y-%jT%H:%M:%S','%Y-%m-%dT%H:%M:%S.%f','%Y%m%d','%H:%M:%S',
+  '%d-%b-%Y-%H:%M:%S','%b/%d/%Y/%I:%M:%S%p','%Y-%m-%d_%H:%M:%S%z','%a-%d-%B-%Y_%H:%M:%S.%f','%d%b%Y']:
+  dates=[d.strftime(f) for d in t.astype(object)]
+  if '%z' in f:
+    dates=[d.replace(tzinfo=timezone.utc).strftime(f) for d in t.astype(object)]
+  if f.endswith('%f'):
+    #fractional seconds with fewer digits
+    for w in range(1,7):
+      dates+=[d[:len(d)-6+w] for d in dates[:100]]
+  dates+=invalid
+  ok=np.array_equal(dp.parse_dates(dates,f),strptime(dates,f),equal_nan=True)
+  layout='fixed width' if dp.fixed_width_layout(f) else 'date and time' if dp.split_date_time(f) else 'strptime'
+  print(f"{f:30s} ({layout}): {'OK' if ok else 'ERROR'}")
+  if not ok:
+    sys.exit(1)
+PYTHON
+
+#----------------------------
+# windows
+#----------------------------
+#one line per minute over two days
+python3 - $TMP/dates.dat <<PYTHON
+import sys
+import numpy as np
+t=np.datetime64('2020-01-01T00:00')+np.arange(2*1440).astype('timedelta64[m]')
+with open(sys.argv[1],'w') as f:
+  for i,d in enumerate(t.astype(object)):
+    f.write(f"{d.strftime('%d-%b-%Y-%H:%M:%S')} {i}\n")
+PYTHON
+#prints the number of rows read with the given arguments
+function rows()
+{
+  $(dirname $DIR)/plot-files.py --files $TMP/dates.dat --labels t,x --x-date-format "%d-%b-%Y-%H:%M:%S" \
+    --out $TMP/dates.png --force --no-output-cache --profile - "$@" 2>&1 >/dev/null \
+    | python3 -c "import sys,json; print(json.loads(sys.stdin.readlines()[-1])['stages']['read']['rows'])"
+}
+#without the data cache, then with it (empty at first, so that windows with --end-x are read directly and the
+#last window fills it) and then with the cached data
+for CACHE in --no-cache --cache-dir=$TMP/cache --cache-dir=$TMP/cache
+do
+  for CASE in "61 -s 01-Jan-2020-12:00:00 -e 01-Jan-2020-13:00:00" "81 -s 2020-01-01T12:00:00 -e 2020-01-01T13:00:00 -w 600" \
+    "1 -e 2020-01-01" "720 -s 02-Jan-2020-12:00:00"
+  do
+    EXPECTED=${CASE%% *}
+    ARGS=(${CASE#* })
+    N=$(rows $CACHE "${ARGS[@]}")
+    echo "window ${ARGS[@]} $CACHE: $N rows (expected $EXPECTED)"
+    if [ $N != $EXPECTED ]
+    then
+      echo "ERROR: wrong number of rows in the window"
+      exit 1
+    fi
+  done
+done
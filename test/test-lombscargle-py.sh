@@ -0,0 +1,33 @@
+#!/bin/bash -ue
+
+# checks the fast lombscargle (spectra.py) against scipy.signal.lombscargle, on the data of test.dat with
+# random gaps; the largest error must be smaller than TOL, relative to the peak of each spectrum
+
+DIR=$(cd $(dirname $BASH_SOURCE);pwd)
+DAT=$DIR/test.dat
+TOL=${TOL:-1e-4}
+
+cd $(dirname $DIR)
+python3 - $DAT $TOL <<PYTHON
+import sys, time
+import numpy as np
+from scipy import signal
+import spectra as sp
+d=np.loadtxt(sys.argv[1])
+x=d[:,2]
+y=d[:,4:7]
+keep=np.random.default_rng(0).random(len(x))>0.3
+x,y=x[keep],y[keep]
+t=time.time()
+f,a=sp.asd(x,y,None,'lombscargle')
+print(f"fast: {time.time()-t:.3f} seconds")
+yd=sp.detrend(x,y)
+t=time.time()
+p=np.column_stack([signal.lombscargle(x,yd[:,j],2*np.pi*f) for j in range(y.shape[1])])
+print(f"slow: {time.time()-t:.3f} seconds")
+err=(np.abs(a**2-p)/p.max(axis=0)).max()
+print(f"error: {err:.3g} (tolerance {sys.argv[2]})")
+if err>float(sys.argv[2]):
+  print("ERROR: fast lombscargle is not accurate enough")
+  sys.exit(1)
+PYTHON
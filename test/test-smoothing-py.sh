@@ -0,0 +1,61 @@
+#!/bin/bash -ue
+
+# checks --gauss on the data of test.dat with 5% of the samples missing, so that many of the stretches between
+# gaps are shorter than the window, with all smoothing methods, that all methods smooth as much and that a
+# constant with gaps stays constant (the data is not pulled towards zero near the gaps)
+
+DIR=$(cd $(dirname $BASH_SOURCE);pwd)
+DAT=$DIR/test.dat
+GAPPY=$(mktemp /tmp/test-smoothing.XXXXXX)
+trap "rm -f $GAPPY $GAPPY.png" EXIT
+
+awk 'BEGIN {srand(1)} rand()>0.05' $DAT > $GAPPY
+
+for i in auto direct fft box
+do
+  $(dirname $DIR)/plot-files.py \
+    --files $GAPPY \
+    --labels "\-,-,t,-,x,y,z,-" \
+    --gauss 10 \
+    --gauss-method $i \
+    --out $GAPPY.png \
+    --force --no-cache --no-output-cache \
+    $@ > /dev/null
+  echo "gauss method $i: OK"
+done
+
+# checks that all methods smooth as much: the standard deviation of the response to an impulse must be the same
+# as with direct convolution, within TOL
+TOL=${TOL:-0.01}
+cd $(dirname $DIR)
+python3 - $TOL <<PYTHON
+import sys
+import numpy as np
+import smoothing as sm
+for n in (300,3000):
+  y=np.zeros(20*n)
+  y[10*n]=1
+  x=np.arange(len(y))-10*n
+  std={m:np.sqrt(np.sum(sm.convolve(y,n,m)*x**2)) for m in ('direct','fft','box')}
+  print(f"window of {n} points, std of the impulse response: "+', '.join(f"{m} {s:.1f}" for m,s in std.items()))
+  if any(abs(s/std['direct']-1)>float(sys.argv[1]) for s in std.values()):
+    print("ERROR: smoothing methods do not smooth as much")
+    sys.exit(1)
+PYTHON
+
+# checks that a constant with 5% of the samples missing stays the same, within TOL, with all methods
+python3 - $TOL <<PYTHON
+import sys
+import numpy as np
+import smoothing as sm
+x=np.arange(20000.)
+x=x[np.random.default_rng(0).random(len(x))>0.05]
+for method in sm.METHODS:
+  for irregular in (False,True):
+    for width in (10,1000):
+      err=np.abs(sm.smooth(x,np.full(len(x),5.0),width,1,method,None,irregular)/5-1).max()
+      print(f"constant smoothed with method {method}, irregular {irregular}, width {width}: largest error {err:.3g}")
+      if err>float(sys.argv[1]):
+        print("ERROR: smoothing does not keep a constant")
+        sys.exit(1)
+PYTHON
@@ -0,0 +1,55 @@
+#!/bin/bash -ue
+
+# checks that plot-files.py starts fast when it has nothing to plot (--out-name and plots that are already
+# available): no plotting module is imported and the average of RUNS runs takes less than BUDGET seconds
+
+DIR=$(cd $(dirname $BASH_SOURCE);pwd)
+DAT=$DIR/test.dat
+BUDGET=${BUDGET:-0.5}
+RUNS=${RUNS:-5}
+HEAVY='matplotlib|pandas|scipy|plotly|htmlcreator|bs4|PIL'
+
+TMP=$(mktemp -d /tmp/test-startup.XXXXXX)
+trap "rm -rf $TMP" EXIT
+
+ARGS=(--files $DAT --labels "\-,-,t,-,x,y,z,-" --out $TMP/plot.png --cache-dir $TMP/cache)
+#the plot that is already available and up to date
+$(dirname $DIR)/plot-files.py "${ARGS[@]}" > /dev/null
+
+for MODE in --out-name up-to-date
+do
+  MODE_ARGS=("${ARGS[@]}")
+  [ $MODE == up-to-date ] || MODE_ARGS+=($MODE)
+  if [ $MODE == up-to-date ] && ! $(dirname $DIR)/plot-files.py "${MODE_ARGS[@]}" | grep -q "up to date"
+  then
+    echo "ERROR: $TMP/plot.png is not up to date"
+    exit 1
+  fi
+
+  #----------------------------
+  # imports
+  #----------------------------
+  IMPORTED=$(python3 -X importtime $(dirname $DIR)/plot-files.py "${MODE_ARGS[@]}" 2>&1 >/dev/null | grep -oE " ($HEAVY)(\.|$)" | tr -d " ." | sort -u || true)
+  if [ -n "$IMPORTED" ]
+  then
+    echo "ERROR: $MODE imports plotting modules:" $IMPORTED
+    exit 1
+  fi
+
+  #----------------------------
+  # startup time
+  #----------------------------
+  START=$(date +%s%N)
+  for i in $(seq $RUNS)
+  do
+    $(dirname $DIR)/plot-files.py "${MODE_ARGS[@]}" $@ > /dev/null
+  done
+  END=$(date +%s%N)
+  AVG=$(awk "BEGIN {print ($END-$START)/$RUNS/1e9}")
+  echo "$MODE startup time: $AVG seconds (budget $BUDGET seconds)"
+  if awk "BEGIN {exit !($AVG>$BUDGET)}"
+  then
+    echo "ERROR: startup time is over budget"
+    exit 1
+  fi
+done